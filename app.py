@@ -2,52 +2,252 @@
 Flask app with:
 • SQLite + SQLAlchemy
 • User auth (Flask-Login)
-• Public map  → /
+• Public map  → /  (viewport queries via R*Tree, /api/resources?bbox=)
+• Clusters    → /api/resources/clusters (per-zoom grid aggregates)
+• Search      → /api/search?q= (FTS5, diacritic-insensitive prefix match)
+• Nearby      → /api/nearby?lat=&lon=|city=&radius= (haversine, R*Tree prefilter)
 • Admin map   → /admin/
 • Admin list  → /admin/list
-• CRUD JSON   → /admin/api/resources
-• AI Chat     → /chat
+• CRUD JSON   → /admin/api/resources (+ /batch: mixed writes in one transaction)
+• Change feed → /api/resources/changes?since= (deltas, polled by the public map) and /changes/stream (SSE, admin)
+• AI Chat     → /chat (SSE streaming, bounded LLM concurrency, server-side sessions)
+• Read APIs served from an in-process LRU with ETag/304 revalidation
 • CSV import support for timis_public_resources.csv
+• create_app() factory; schema migrations run once, tracked in schema_version
+• Semantic chat retrieval over a memory-mapped vector index (build_index.py)
+• Prometheus metrics → /metrics (latency, SQL, chat phases, LLM tokens, caches)
 """
 from pathlib import Path
-import os, sqlite3, json
-
-from flask import (Flask, render_template, jsonify, request,
-                   redirect, url_for, flash)
+import os, re, sys, gzip, struct, sqlite3, json, math, time, base64, hashlib, secrets, threading, asyncio, queue, unicodedata
+import importlib.util, logging
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import (Flask, Blueprint, current_app, g, has_request_context, render_template, jsonify,
+                   request, redirect, url_for, flash, Response, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import table, column, event
+from sqlalchemy.engine import Engine, make_url
 from flask_login import (LoginManager, UserMixin, login_user,
                          logout_user, current_user, login_required)
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# openai takes most of a second to import; LLMGateway imports it on first use
+HAS_OPENAI = importlib.util.find_spec("openai") is not None
+
 try:
-    from openai import OpenAI
-    HAS_OPENAI = True
+    import brotli
+    HAS_BROTLI = True
 except ImportError:
-    HAS_OPENAI = False
+    HAS_BROTLI = False
 
 # ── configuration ─────────────────────────────────────────
 BASE = Path(__file__).resolve().parent
 DB   = BASE / "resources.db"
 
-app = Flask(__name__, static_folder="static", template_folder="templates")
-app.config.update(
+# SQLite tuning, applied to every pooled connection. WAL lets readers run
+# alongside the single writer; SQLITE_TUNING=0 restores the defaults (A/B runs).
+DB_POOL_SIZE   = int(os.getenv("DB_POOL_SIZE", "8"))     # per worker process
+SQLITE_TUNING  = os.getenv("SQLITE_TUNING", "1") == "1"
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",       # fsync at checkpoints only; durable enough with WAL
+    "PRAGMA busy_timeout = 5000",        # wait for the write lock instead of failing
+    "PRAGMA cache_size = -65536",        # 64 MiB page cache
+    "PRAGMA mmap_size = 268435456",      # 256 MiB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+
+DEFAULT_CONFIG = dict(
     SQLALCHEMY_DATABASE_URI       = f"sqlite:///{DB}",
     SQLALCHEMY_TRACK_MODIFICATIONS= False,
     SECRET_KEY                    = os.getenv("SECRET_KEY", "change-me")
 )
-db = SQLAlchemy(app)
-
-login_manager = LoginManager(app)
-login_manager.login_view = "login"
-
-# Initialize local LLM client
-if HAS_OPENAI:
-    client = OpenAI(
-        base_url="http://172.20.10.6:1234/v1",
-        api_key="not-needed"  # Local LLM doesn't require API key
-    )
-else:
-    client = None
+# Only for file databases: in-memory SQLite gets a StaticPool, which takes no sizing
+DB_POOL_OPTIONS = dict(pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_SIZE, pool_timeout=10)
+
+def _is_file_db(uri):
+    url = make_url(uri)
+    return url.get_backend_name() != "sqlite" or url.database not in (None, "", ":memory:")
+db = SQLAlchemy()
+bp = Blueprint("main", __name__)
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_con, _record):
+    if SQLITE_TUNING and isinstance(dbapi_con, sqlite3.Connection):
+        cur = dbapi_con.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cur.execute(pragma)
+        cur.close()
+
+def _connect():
+    """Raw connection to the app's database for schema setup; waits out
+    other workers' migrations. An in-memory database only exists on the
+    engine's one StaticPool connection, so that is the one handed out."""
+    if not _is_file_db(db.engine.url):
+        return db.engine.raw_connection().driver_connection
+    return sqlite3.connect(db.engine.url.database, timeout=30)
+
+login_manager = LoginManager()
+login_manager.login_view = "main.login"
+
+# Local LLM server (OpenAI-compatible); see mock_llm.py for a test stand-in
+LLM_BASE_URL        = os.getenv("LLM_BASE_URL", "http://172.20.10.6:1234/v1")
+LLM_MODEL           = os.getenv("LLM_MODEL", "qwen/qwen3-14b")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))   # generations in flight
+LLM_MAX_QUEUE       = int(os.getenv("LLM_MAX_QUEUE", "32"))        # requests waiting for a slot
+LLM_QUEUE_TIMEOUT   = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # seconds before giving up
+CHAT_PROMPT_TOKENS  = int(os.getenv("CHAT_PROMPT_TOKENS", "6000"))   # per LLM call, excluding the reply
+CHAT_SESSION_TTL    = float(os.getenv("CHAT_SESSION_TTL", "3600"))   # idle seconds before a conversation expires
+CHAT_MAX_SESSIONS   = int(os.getenv("CHAT_MAX_SESSIONS", "5000"))    # oldest conversations evicted beyond this
+CHAT_SESSION_TURNS  = int(os.getenv("CHAT_SESSION_TURNS", "12"))     # verbatim turns kept per conversation
+
+# ── instrumentation ──────────────────────────────────────
+# Process-local counters and histograms, rendered in the Prometheus text
+# format at /metrics. Under gunicorn each worker keeps its own series, so
+# scrape them per instance or sum in the query. LOG_FORMAT=json also logs
+# one JSON line per request with its SQL count/time and chat phase timings.
+LOG_FORMAT      = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL       = os.getenv("LOG_LEVEL", "INFO")
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Metrics:
+    """Thread-safe registry of labelled counters and histograms."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._help = {}                 # name → (type, help text)
+        self._counters = {}             # (name, labels) → value
+        self._histograms = {}           # (name, labels) → [cumulative bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    @staticmethod
+    def _labels(labels, **extra):
+        pairs = [*labels, *extra.items()]
+        if not pairs:
+            return ""
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+    def render(self, samples=()):
+        """Prometheus text exposition; `samples` adds (name, type, help, labels,
+        value) series computed at scrape time from counters kept elsewhere."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        lines, described = [], set()
+
+        def header(name, kind, text=None):
+            if name not in described:
+                described.add(name)
+                kind, text = self._help.get(name, (kind, text or name))
+                lines.extend((f"# HELP {name} {text}", f"# TYPE {name} {kind}"))
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), h in histograms:
+            header(name, "histogram")
+            for bound, n in zip(self.buckets, h):
+                lines.append(f"{name}_bucket{self._labels(labels, le=bound)} {n}")
+            lines.append(f"{name}_bucket{self._labels(labels, le='+Inf')} {h[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {h[-2]}")
+            lines.append(f"{name}_count{self._labels(labels)} {h[-1]}")
+        for name, kind, text, labels, value in samples:
+            header(name, kind, text)
+            lines.append(f"{name}{self._labels(tuple(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+for _name, _kind, _text in (
+        ("http_request_seconds",    "histogram", "Request latency by endpoint, method and status"),
+        ("sql_query_seconds",       "histogram", "SQL statement duration by endpoint"),
+        ("response_build_seconds",  "histogram", "Cached-view miss cost: view (query + serialize) and compress"),
+        ("chat_phase_seconds",      "histogram", "Time spent in each /api/chat pipeline phase"),
+        ("llm_requests_total",      "counter",   "LLM calls by mode, purpose and outcome"),
+        ("llm_request_seconds",     "histogram", "LLM call duration including the queue wait"),
+        ("llm_queue_wait_seconds",  "histogram", "Time spent waiting for a free LLM slot"),
+        ("llm_first_token_seconds", "histogram", "Streaming LLM time to first token"),
+        ("llm_tokens_total",        "counter",   "LLM tokens by purpose and kind (server-reported or estimated)"),
+        ("chat_retrieval_total",    "counter",   "Chat retrievals served by the vector index or the type tiers"),
+        ("chat_sessions_total",     "counter",   "Server-side chat conversations created, resumed or expired"),
+        ("change_events_total",     "counter",   "Change-feed SSE events sent, by kind (changes or reset)")):
+    metrics.describe(_name, _kind, _text)
+
+def process_age():
+    """Seconds since this process was started by the OS (so interpreter and
+    import time count too), or None where /proc is not available."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+@contextmanager
+def timed_phase(name):
+    """Time one chat pipeline phase into chat_phase_seconds and the request log."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        metrics.observe("chat_phase_seconds", elapsed, phase=name)
+        if has_request_context():
+            g.setdefault("phases", {})[name] = round(1000 * elapsed, 2)
+
+def _endpoint_label():
+    return (request.endpoint or "unmatched") if has_request_context() else "none"
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    metrics.observe("sql_query_seconds", elapsed, endpoint=_endpoint_label())
+    if has_request_context() and "sql_queries" in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+
+@event.listens_for(Engine, "handle_error")
+def _sql_failed(context):
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per record; `extra={"fields": {...}}` merges into it."""
+
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname,
+                 "logger": record.name, "msg": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
 
 # ── models ────────────────────────────────────────────────
 class User(UserMixin, db.Model):
@@ -59,15 +259,15 @@ class Resource(db.Model):
     __tablename__ = "resource"
     id          = db.Column(db.Integer, primary_key=True)
     name        = db.Column(db.String, nullable=False)
-    type        = db.Column(db.String, nullable=False)  # Space | Volunteer | Partner | Logistics | Grant | Event
-    city        = db.Column(db.String)
+    type        = db.Column(db.String, nullable=False, index=True)  # Space | Volunteer | Partner | Logistics | Grant | Event
+    city        = db.Column(db.String, index=True)
     lat         = db.Column(db.Float)
     lon         = db.Column(db.Float)
     capacity    = db.Column(db.Integer)
     description = db.Column(db.Text)
     url         = db.Column(db.String)
     contact     = db.Column(db.String)
-    category    = db.Column(db.String)
+    category    = db.Column(db.String, index=True)
 
     def to_dict(self):
         return dict(
@@ -77,10 +277,18 @@ class Resource(db.Model):
             description=self.description, contact=self.contact
         )
 
+class ChatSession(db.Model):
+    """Server-side chat conversation (see ConversationStore)."""
+    __tablename__ = "chat_session"
+    id         = db.Column(db.String(32), primary_key=True)
+    summary    = db.Column(db.Text, nullable=False, default="[]")   # JSON list of folded-turn lines
+    turns      = db.Column(db.Text, nullable=False, default="[]")   # JSON list of {"role", "content"}
+    updated_at = db.Column(db.Float, nullable=False, index=True)
+
 # ── one-time automatic column patch (SQLite) ─────────────
 def _ensure_new_columns():
     table = Resource.__tablename__          # ← use the real table name ("resource")
-    with sqlite3.connect(DB) as con:
+    with _connect() as con:
         # Check if we need to migrate from old "place" table
         tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
         if "place" in tables and "resource" not in tables:
@@ -102,43 +310,990 @@ def _ensure_new_columns():
         if "category" not in cols:
             con.execute(f"ALTER TABLE {table} ADD COLUMN category TEXT;")
 
-with app.app_context():
+# ── spatial index (SQLite R*Tree) ────────────────────────
+# One bounding box per resource, kept in sync by triggers so that every
+# writer (CRUD handlers, import_csv.py, sqlite3 shell) updates it for free.
+RTREE = "resource_rtree"
+resource_rtree = table(RTREE, column("id"), column("min_lon"), column("max_lon"),
+                       column("min_lat"), column("max_lat"))
+
+def _ensure_spatial_index():
+    with _connect() as con:
+        con.executescript(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE}
+                USING rtree(id, min_lon, max_lon, min_lat, max_lat);
+
+            CREATE TRIGGER IF NOT EXISTS resource_rtree_ai AFTER INSERT ON resource
+            WHEN new.lat IS NOT NULL AND new.lon IS NOT NULL BEGIN
+                INSERT INTO {RTREE} VALUES (new.id, new.lon, new.lon, new.lat, new.lat);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS resource_rtree_au AFTER UPDATE OF id, lat, lon ON resource BEGIN
+                DELETE FROM {RTREE} WHERE id = old.id;
+                INSERT INTO {RTREE}
+                    SELECT new.id, new.lon, new.lon, new.lat, new.lat
+                    WHERE new.lat IS NOT NULL AND new.lon IS NOT NULL;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS resource_rtree_ad AFTER DELETE ON resource BEGIN
+                DELETE FROM {RTREE} WHERE id = old.id;
+            END;
+        """)
+        # Backfill rows written before the index existed
+        con.execute(f"""
+            INSERT INTO {RTREE}
+            SELECT id, lon, lon, lat, lat FROM resource
+            WHERE lat IS NOT NULL AND lon IS NOT NULL
+              AND id NOT IN (SELECT id FROM {RTREE})
+        """)
+
+# ── per-zoom cluster aggregates ──────────────────────────
+# resource_cluster holds count and coordinate sums per (zoom, grid cell, type)
+# for zooms 0..CLUSTER_MAX_ZOOM. Triggers apply ±1 deltas on every write, so
+# the clusters endpoint never has to aggregate the resource table itself.
+# The public map shows raw markers from zoom 12 up, and finer levels would
+# cost roughly one aggregate row per resource each.
+CLUSTER_MAX_ZOOM = 12
+CLUSTER_CELLS_PER_TILE = 4      # grid cells per map tile edge (~64px at 256px tiles)
+
+def _cluster_step(zoom):
+    """Grid cell size in degrees at a zoom level."""
+    return 360.0 / (2 ** zoom * CLUSTER_CELLS_PER_TILE)
+
+# Cell indexes are offset by +180/+90 so truncation equals floor()
+_CLUSTER_CELL = "CAST(({r}.lon + 180) / z.step AS INTEGER), CAST(({r}.lat + 90) / z.step AS INTEGER)"
+
+def _ensure_cluster_aggregates():
+    cell = _CLUSTER_CELL
+    with _connect() as con:
+        con.executescript(f"""
+            BEGIN;
+            CREATE TABLE IF NOT EXISTS cluster_zoom (z INTEGER PRIMARY KEY, step REAL NOT NULL);
+
+            CREATE TABLE IF NOT EXISTS resource_cluster (
+                zoom INTEGER NOT NULL, cx INTEGER NOT NULL, cy INTEGER NOT NULL,
+                type TEXT NOT NULL, n INTEGER NOT NULL,
+                sum_lat REAL NOT NULL, sum_lon REAL NOT NULL,
+                PRIMARY KEY (zoom, cx, cy, type)
+            ) WITHOUT ROWID;
+
+            CREATE TRIGGER IF NOT EXISTS resource_cluster_ai AFTER INSERT ON resource
+            WHEN new.lat IS NOT NULL AND new.lon IS NOT NULL BEGIN
+                INSERT INTO resource_cluster
+                    SELECT z.z, {cell.format(r="new")}, new.type, 1, new.lat, new.lon
+                    FROM cluster_zoom z WHERE 1
+                ON CONFLICT (zoom, cx, cy, type) DO UPDATE SET
+                    n = n + 1, sum_lat = sum_lat + excluded.sum_lat,
+                    sum_lon = sum_lon + excluded.sum_lon;
+            END;
+
+            -- Row-value IN on the full primary key keeps the ±1 deltas to
+            -- index lookups; the n <= 0 cleanup only touches the same cells
+            DROP TRIGGER IF EXISTS resource_cluster_ad;
+            CREATE TRIGGER resource_cluster_ad AFTER DELETE ON resource
+            WHEN old.lat IS NOT NULL AND old.lon IS NOT NULL BEGIN
+                UPDATE resource_cluster SET
+                    n = n - 1, sum_lat = sum_lat - old.lat, sum_lon = sum_lon - old.lon
+                WHERE (zoom, cx, cy, type) IN
+                    (SELECT z.z, {cell.format(r="old")}, old.type FROM cluster_zoom z);
+                DELETE FROM resource_cluster WHERE n <= 0 AND (zoom, cx, cy, type) IN
+                    (SELECT z.z, {cell.format(r="old")}, old.type FROM cluster_zoom z);
+            END;
+
+            DROP TRIGGER IF EXISTS resource_cluster_au;
+            CREATE TRIGGER resource_cluster_au AFTER UPDATE OF lat, lon, type ON resource BEGIN
+                UPDATE resource_cluster SET
+                    n = n - 1, sum_lat = sum_lat - old.lat, sum_lon = sum_lon - old.lon
+                WHERE (zoom, cx, cy, type) IN
+                    (SELECT z.z, {cell.format(r="old")}, old.type FROM cluster_zoom z
+                     WHERE old.lat IS NOT NULL AND old.lon IS NOT NULL);
+                DELETE FROM resource_cluster WHERE n <= 0 AND (zoom, cx, cy, type) IN
+                    (SELECT z.z, {cell.format(r="old")}, old.type FROM cluster_zoom z
+                     WHERE old.lat IS NOT NULL AND old.lon IS NOT NULL);
+                INSERT INTO resource_cluster
+                    SELECT z.z, {cell.format(r="new")}, new.type, 1, new.lat, new.lon
+                    FROM cluster_zoom z WHERE new.lat IS NOT NULL AND new.lon IS NOT NULL
+                ON CONFLICT (zoom, cx, cy, type) DO UPDATE SET
+                    n = n + 1, sum_lat = sum_lat + excluded.sum_lat,
+                    sum_lon = sum_lon + excluded.sum_lon;
+            END;
+            COMMIT;
+        """)
+        con.executemany("INSERT OR REPLACE INTO cluster_zoom VALUES (?, ?)",
+                        [(z, _cluster_step(z)) for z in range(CLUSTER_MAX_ZOOM + 1)])
+        con.execute("DELETE FROM cluster_zoom WHERE z > ?", (CLUSTER_MAX_ZOOM,))
+        con.execute("DELETE FROM resource_cluster WHERE zoom > ?", (CLUSTER_MAX_ZOOM,))
+
+        # Rebuild if the aggregates drifted (first run, or rows written without triggers)
+        located = con.execute("SELECT count(*) FROM resource WHERE lat IS NOT NULL AND lon IS NOT NULL").fetchone()[0]
+        counted = con.execute("SELECT coalesce(sum(n), 0) FROM resource_cluster WHERE zoom = 0").fetchone()[0]
+        if located != counted:
+            con.execute("DELETE FROM resource_cluster")
+            con.execute(f"""
+                INSERT INTO resource_cluster
+                SELECT z.z, {cell.format(r="r")}, r.type, count(*), sum(r.lat), sum(r.lon)
+                FROM resource r, cluster_zoom z
+                WHERE r.lat IS NOT NULL AND r.lon IS NOT NULL
+                GROUP BY 1, 2, 3, 4
+            """)
+
+# ── full-text search (SQLite FTS5) ───────────────────────
+# External-content FTS5 table over the searchable columns. unicode61 with
+# remove_diacritics folds "Timișoara" and "Timisoara" to the same token;
+# prefix indexes make "tim*" queries cheap.
+FTS = "resource_fts"
+
+def _ensure_search_index():
+    with _connect() as con:
+        exists = con.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (FTS,)).fetchone()
+        con.executescript(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {FTS} USING fts5(
+                name, description, city, category,
+                content='resource', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS resource_fts_ai AFTER INSERT ON resource BEGIN
+                INSERT INTO {FTS}(rowid, name, description, city, category)
+                VALUES (new.id, new.name, new.description, new.city, new.category);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS resource_fts_ad AFTER DELETE ON resource BEGIN
+                INSERT INTO {FTS}({FTS}, rowid, name, description, city, category)
+                VALUES ('delete', old.id, old.name, old.description, old.city, old.category);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS resource_fts_au
+            AFTER UPDATE OF id, name, description, city, category ON resource BEGIN
+                INSERT INTO {FTS}({FTS}, rowid, name, description, city, category)
+                VALUES ('delete', old.id, old.name, old.description, old.city, old.category);
+                INSERT INTO {FTS}(rowid, name, description, city, category)
+                VALUES (new.id, new.name, new.description, new.city, new.category);
+            END;
+        """)
+        if not exists:
+            con.execute(f"INSERT INTO {FTS}({FTS}) VALUES ('rebuild')")
+
+def _fts_match(text, column=None):
+    """Free text → FTS5 MATCH expression: every word must match as a prefix,
+    optionally within one column. None when there is nothing to search for."""
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    expr = " AND ".join(f'"{w}"*' for w in words)
+    return f"{column} : ({expr})" if column else expr
+
+def _fts_ids(match):
+    """Subquery of resource ids matching an FTS5 expression."""
+    return db.text(f"SELECT rowid FROM {FTS} WHERE {FTS} MATCH :match") \
+             .bindparams(match=match).columns(db.column("rowid"))
+
+def _parse_bbox(raw, zoom=None):
+    """'minLon,minLat,maxLon,maxLat' → tuple of floats (ValueError if malformed).
+    With a zoom level the box is snapped outward to that zoom's tile grid so
+    small pans reuse the same query."""
+    min_lon, min_lat, max_lon, max_lat = (float(v) for v in raw.split(","))
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox min > max")
+    if zoom is not None:
+        step = 360.0 / (2 ** max(0, min(zoom, 22)))
+        min_lon, min_lat = (math.floor(v / step) * step for v in (min_lon, min_lat))
+        max_lon, max_lat = (math.ceil(v / step) * step for v in (max_lon, max_lat))
+    return min_lon, min_lat, max_lon, max_lat
+
+def _bbox_ids(bbox):
+    """R*Tree subquery of resource ids whose box intersects `bbox`."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return (db.select(resource_rtree.c.id)
+              .where(resource_rtree.c.max_lon >= min_lon, resource_rtree.c.min_lon <= max_lon,
+                     resource_rtree.c.max_lat >= min_lat, resource_rtree.c.min_lat <= max_lat))
+
+def _in_bbox(q, bbox):
+    """Restrict a Resource query to ids whose R*Tree box intersects `bbox`."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    # R*Tree stores 32-bit floats, so re-check the exact coordinates
+    return q.filter(Resource.id.in_(_bbox_ids(bbox)),
+                    Resource.lon.between(min_lon, max_lon),
+                    Resource.lat.between(min_lat, max_lat))
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def _radius_bbox(lat, lon, radius_km):
+    """Smallest lat/lon box containing the circle (prefilter for haversine)."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+def _nearest_ids(lat, lon, bbox, n):
+    """R*Tree subquery of the `n` ids in `bbox` nearest (lat, lon), ordered by
+    the index's own (32-bit) coordinates without reading the resource table."""
+    t = resource_rtree.c
+    k = math.cos(math.radians(lat))
+    d2 = (t.min_lat - lat) * (t.min_lat - lat) + (t.min_lon - lon) * (t.min_lon - lon) * (k * k)
+    return _bbox_ids(bbox).order_by(d2).limit(n)
+
+def _distance_order(lat, lon):
+    """SQL expression ordering rows like haversine distance from (lat, lon):
+    equirectangular squared distance, with unlocated rows last."""
+    k = math.cos(math.radians(lat))
+    d2 = (Resource.lat - lat) * (Resource.lat - lat) + (Resource.lon - lon) * (Resource.lon - lon) * (k * k)
+    return db.func.coalesce(d2, 1e18)
+
+_city_centers = OrderedDict()       # (dataset version, normalized city) → (lat, lon)
+
+def city_center(city):
+    """Mean position of the located resources in `city` (diacritic-insensitive),
+    or None if it has none. Cached per dataset version; misses are not cached,
+    so unknown names from request parameters can't crowd out real cities."""
+    match = _fts_match(city, column="city")
+    if not match:
+        return None
+    key = (response_cache.version(), _normalize(city))
+    center = _city_centers.get(key)
+    if center is None:
+        lat, lon = db.session.query(db.func.avg(Resource.lat), db.func.avg(Resource.lon)).filter(
+            Resource.id.in_(_fts_ids(match)),
+            Resource.lat.isnot(None), Resource.lon.isnot(None),
+            db.not_(db.and_(Resource.lat == 0, Resource.lon == 0))).one()   # 0,0 = not localized
+        if lat is None:
+            return None
+        center = _city_centers[key] = (lat, lon)
+        while len(_city_centers) > 256:
+            _city_centers.popitem(last=False)
+    return center
+
+# ── dataset version + response cache ─────────────────────
+# Triggers bump dataset_version on every resource write, whichever process
+# makes it (web workers, import_csv.py). Each worker keeps serialized read
+# responses in an LRU tagged with the version it was built from.
+def _ensure_dataset_version():
+    with _connect() as con:
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS dataset_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO dataset_version VALUES (1, 1);
+
+            CREATE TRIGGER IF NOT EXISTS resource_version_ai AFTER INSERT ON resource BEGIN
+                UPDATE dataset_version SET version = version + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS resource_version_au AFTER UPDATE ON resource BEGIN
+                UPDATE dataset_version SET version = version + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS resource_version_ad AFTER DELETE ON resource BEGIN
+                UPDATE dataset_version SET version = version + 1;
+            END;
+        """)
+
+class ResponseCache:
+    """LRU of serialized JSON bodies keyed by (endpoint, query string).
+
+    The dataset version is re-read from SQLite at most every `version_ttl`
+    seconds, so writes by other processes show up within that window and
+    writes by this one show up immediately via `invalidate()`."""
+
+    def __init__(self, max_entries=512, version_ttl=1.0):
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self._entries = OrderedDict()       # key → (body, etag)
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def version(self):
+        now = time.monotonic()
+        if now - self._checked_at > self.version_ttl:
+            v = db.session.execute(db.text("SELECT version FROM dataset_version")).scalar()
+            with self._lock:
+                if v != self._version:
+                    self._entries.clear()
+                    self._version = v
+                self._checked_at = now
+        return self._version
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return hit
+
+    def put(self, key, body, mimetype="application/json", encoding=None):
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        entry = (body, etag, mimetype, encoding)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        """Force a version re-read on the next lookup (call after committing writes)."""
+        self._checked_at = 0.0
+
+response_cache = ResponseCache()
+
+COLUMNAR_MIME      = "application/x-resource-columns"
+COMPRESS_MIN_BYTES = 1024
+
+def wants_columnar():
+    """True when the client asked for the columnar format (format=columnar or Accept)."""
+    return (request.args.get("format") == "columnar"
+            or request.accept_mimetypes.quality(COLUMNAR_MIME) > request.accept_mimetypes.quality("application/json"))
+
+def _negotiate_encoding():
+    if HAS_BROTLI and request.accept_encodings.quality("br"):
+        return "br"
+    if request.accept_encodings.quality("gzip"):
+        return "gzip"
+    return None
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+def cached_json(view):
+    """Serve a read-only view from `response_cache`, compressed once per
+    representation and tagged with a strong ETag so clients and proxies can
+    revalidate with a cheap 304."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = response_cache.version()
+        encoding = _negotiate_encoding()
+        key = (request.endpoint, version, wants_columnar(), encoding,
+               tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+        hit = response_cache.get(key)
+        if hit is None:
+            t0 = time.perf_counter()
+            rv = current_app.make_response(view(*args, **kwargs))
+            if rv.status_code != 200:
+                return rv
+            body = rv.get_data()
+            t1 = time.perf_counter()
+            metrics.observe("response_build_seconds", t1 - t0, endpoint=request.endpoint, stage="view")
+            if encoding and len(body) >= COMPRESS_MIN_BYTES:
+                body = _compress(body, encoding)
+                metrics.observe("response_build_seconds", time.perf_counter() - t1,
+                                endpoint=request.endpoint, stage="compress")
+            else:
+                encoding = None
+            hit = response_cache.put(key, body, rv.mimetype, encoding)
+        body, etag, mimetype, encoding = hit
+        resp = current_app.response_class(body, mimetype=mimetype)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        resp.vary.update(("Accept", "Accept-Encoding"))
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "public, no-cache"   # always revalidate
+        return resp.make_conditional(request)
+    return wrapper
+
+# ── columnar delivery format ─────────────────────────────
+# Layout (little-endian): b"RCOL" | u32 header length | UTF-8 JSON header,
+# padded to 4 bytes | column buffers, each padded to 4 bytes. The header
+# holds {"count", "columns": [{"name", "kind", "offset", ...}]}, with offsets
+# relative to the first buffer. Kinds:
+#   u32 / i32 / f32  typed arrays (i32 null = -2**31, f32 null = NaN)
+#   dict             u16 codes into "values" (0xFFFF = null)
+#   str              no buffer; "values" is the plain list
+# static/columnar.js decodes it.
+_ARRAY_CODES = {"u32": "I", "i32": "i", "f32": "f", "dict": "H"}
+_I32_NULL = -2 ** 31
+
+def encode_columns(spec, rows):
+    """rows: sequence of tuples; spec: [(name, kind), ...] in tuple order."""
+    columns, buffers, offset = [], [], 0
+    for i, (name, kind) in enumerate(spec):
+        col = {"name": name, "kind": kind}
+        values = [r[i] for r in rows]
+        if kind == "str":
+            col["values"] = values
+            columns.append(col)
+            continue
+        if kind == "dict":
+            dictionary = sorted({v for v in values if v is not None})
+            if len(dictionary) >= 0xFFFF:           # too many distinct values for u16 codes
+                col.update(kind="str", values=values)
+                columns.append(col)
+                continue
+            codes = {v: n for n, v in enumerate(dictionary)}
+            col["values"] = dictionary
+            values = [0xFFFF if v is None else codes[v] for v in values]
+        elif kind == "f32":
+            values = [math.nan if v is None else v for v in values]
+        elif kind == "i32":
+            values = [_I32_NULL if v is None else v for v in values]
+        buf = array(_ARRAY_CODES[kind], values)
+        if sys.byteorder == "big":
+            buf.byteswap()
+        raw = buf.tobytes()
+        raw += b"\0" * (-len(raw) % 4)
+        col["offset"] = offset
+        offset += len(raw)
+        buffers.append(raw)
+        columns.append(col)
+    header = json.dumps({"count": len(rows), "columns": columns}, separators=(",", ":")).encode()
+    header += b" " * (-len(header) % 4)
+    return b"".join([b"RCOL", struct.pack("<I", len(header)), header, *buffers])
+
+def columnar_response(spec, rows):
+    return current_app.response_class(encode_columns(spec, rows), mimetype=COLUMNAR_MIME)
+
+# ── change log ───────────────────────────────────────────
+# One row per resource id, holding the latest write to it: REPLACE on the
+# unique resource_id re-inserts the row under a fresh AUTOINCREMENT version,
+# so versions only ever grow and "everything since v" is a primary-key range
+# scan that names each changed resource once. Triggers log single-row writes
+# from any process; the bulk helpers below log set-based.
+CHANGES_PAGE     = 500          # default/maximum rows per /api/resources/changes page
+CHANGES_PAGE_MAX = 5000
+
+def _ensure_change_log():
+    with _connect() as con:
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS resource_change (
+                version     INTEGER PRIMARY KEY AUTOINCREMENT,
+                resource_id INTEGER NOT NULL UNIQUE,
+                op          TEXT NOT NULL CHECK (op IN ('upsert', 'delete'))
+            );
+
+            CREATE TRIGGER IF NOT EXISTS resource_change_ai AFTER INSERT ON resource BEGIN
+                INSERT OR REPLACE INTO resource_change (resource_id, op) VALUES (new.id, 'upsert');
+            END;
+            CREATE TRIGGER IF NOT EXISTS resource_change_au AFTER UPDATE ON resource BEGIN
+                INSERT OR REPLACE INTO resource_change (resource_id, op) VALUES (new.id, 'upsert');
+            END;
+            CREATE TRIGGER IF NOT EXISTS resource_change_ad AFTER DELETE ON resource BEGIN
+                INSERT OR REPLACE INTO resource_change (resource_id, op) VALUES (old.id, 'delete');
+            END;
+        """)
+
+resource_change = table("resource_change", column("version"), column("resource_id"), column("op"))
+
+def change_version():
+    """Latest change-log version (0 before the first logged write)."""
+    return db.session.scalar(db.select(db.func.coalesce(db.func.max(resource_change.c.version), 0)))
+
+def changes_since(since, limit=CHANGES_PAGE):
+    """→ (changes, more): up to `limit` entries after version `since`, oldest
+    first, as {"v", "op", "id", "resource"} with the current row for upserts."""
+    c = resource_change.c
+    rows = db.session.execute(
+        db.select(c.version, c.op, c.resource_id, Resource).select_from(resource_change)
+        .outerjoin(Resource, Resource.id == c.resource_id)
+        .where(c.version > since).order_by(c.version).limit(limit + 1)).all()
+    changes = [{"v": v, "op": op, "id": pid, "resource": r.to_dict() if r is not None else None}
+               for v, op, pid, r in rows[:limit]]
+    return changes, len(rows) > limit
+
+# ── bulk writes ──────────────────────────────────────────
+# The per-row triggers cost ~5k rows/s together on insert, and more on update
+# and delete (every zoom level's cluster cell is touched twice per row). Bulk
+# writes suspend them inside the caller's transaction and maintain the same
+# derived tables with one set-based statement each.
+INSERT_TRIGGERS = ("resource_rtree_ai", "resource_cluster_ai", "resource_fts_ai", "resource_version_ai",
+                   "resource_change_ai")
+UPDATE_TRIGGERS = ("resource_rtree_au", "resource_cluster_au", "resource_fts_au", "resource_version_au",
+                   "resource_change_au")
+DELETE_TRIGGERS = ("resource_rtree_ad", "resource_cluster_ad", "resource_fts_ad", "resource_version_ad",
+                   "resource_change_ad")
+
+@contextmanager
+def _triggers_suspended(conn, names):
+    # Bumping the version first opens the write transaction, so the trigger
+    # DDL below commits or rolls back together with the rows
+    conn.exec_driver_sql("UPDATE dataset_version SET version = version + 1")
+    in_list = ", ".join(f"'{n}'" for n in names)
+    saved = conn.exec_driver_sql(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({in_list})").all()
+    for name, _ in saved:
+        conn.exec_driver_sql(f"DROP TRIGGER {name}")
+    yield
+    for _, sql in saved:
+        conn.exec_driver_sql(sql)
+
+def _stage_ids(conn, ids):
+    """Load ids into the temp table batch_ids for set-based joins."""
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS batch_ids (id INTEGER PRIMARY KEY)")
+    conn.exec_driver_sql("DELETE FROM batch_ids")
+    conn.exec_driver_sql("INSERT OR IGNORE INTO batch_ids VALUES (?)", [(i,) for i in ids])
+
+def _apply_cluster_delta(conn, where, params=(), sign=1):
+    """Add (sign=1) or remove (sign=-1) the resource rows matching `where`
+    (SQL over alias r) to/from the cluster aggregates."""
+    # Aggregate the rows at the finest zoom only, then roll each coarser
+    # level up from the one below (cells halve exactly: cx >> 1, cy >> 1)
+    conn.exec_driver_sql("""
+        CREATE TEMP TABLE IF NOT EXISTS cluster_delta (
+            zoom INTEGER, cx INTEGER, cy INTEGER, type TEXT, n INTEGER, sum_lat REAL, sum_lon REAL)""")
+    conn.exec_driver_sql("DELETE FROM cluster_delta")
+    conn.exec_driver_sql(f"""
+        INSERT INTO cluster_delta
+        SELECT z.z, {_CLUSTER_CELL.format(r="r")}, r.type, {sign} * count(*), {sign} * sum(r.lat), {sign} * sum(r.lon)
+        FROM resource r, cluster_zoom z
+        WHERE z.z = ? AND ({where}) AND r.lat IS NOT NULL AND r.lon IS NOT NULL
+        GROUP BY 1, 2, 3, 4""", (CLUSTER_MAX_ZOOM, *params))
+    for zoom in range(CLUSTER_MAX_ZOOM - 1, -1, -1):
+        conn.exec_driver_sql("""
+            INSERT INTO cluster_delta
+            SELECT ?, cx / 2, cy / 2, type, sum(n), sum(sum_lat), sum(sum_lon)
+            FROM cluster_delta WHERE zoom = ? GROUP BY 2, 3, 4""", (zoom, zoom + 1))
+    conn.exec_driver_sql("""
+        INSERT INTO resource_cluster SELECT * FROM cluster_delta WHERE 1
+        ON CONFLICT (zoom, cx, cy, type) DO UPDATE SET
+            n = n + excluded.n, sum_lat = sum_lat + excluded.sum_lat,
+            sum_lon = sum_lon + excluded.sum_lon""")
+    if sign < 0:
+        conn.exec_driver_sql("""
+            DELETE FROM resource_cluster WHERE n <= 0 AND (zoom, cx, cy, type) IN
+                (SELECT zoom, cx, cy, type FROM cluster_delta)""")
+
+def _fts_write(conn, where, params=(), delete=False):
+    """Add the resource rows matching `where` to the FTS index, or remove them."""
+    command = f"{FTS}, " if delete else ""
+    conn.exec_driver_sql(f"""
+        INSERT INTO {FTS}({command}rowid, name, description, city, category)
+        SELECT {"'delete', " if delete else ""}id, name, description, city, category
+        FROM resource r WHERE {where}""", params)
+
+def _log_changes(conn, where, params=(), op="upsert"):
+    conn.exec_driver_sql(f"""
+        INSERT OR REPLACE INTO resource_change (resource_id, op)
+        SELECT id, '{op}' FROM resource r WHERE {where} ORDER BY id""", params)
+
+_IN_BATCH = "r.id IN (SELECT id FROM batch_ids)"
+
+def bulk_insert_resources(values):
+    """executemany-insert `values` (dicts of Resource columns, no ids) and update
+    the R*Tree, cluster aggregates, FTS index and dataset version for them.
+    Runs in the current session transaction; the caller commits. Returns the
+    highest id before the insert: the new rows are the ones above it."""
+    if not values:
+        return None
+    conn = db.session.connection()
+    with _triggers_suspended(conn, INSERT_TRIGGERS):
+        first = conn.exec_driver_sql("SELECT coalesce(max(id), 0) FROM resource").scalar()
+        conn.execute(db.insert(Resource), values)
+        conn.exec_driver_sql(f"""
+            INSERT INTO {RTREE}
+            SELECT id, lon, lon, lat, lat FROM resource
+            WHERE id > ? AND lat IS NOT NULL AND lon IS NOT NULL""", (first,))
+        _apply_cluster_delta(conn, "r.id > ?", (first,))
+        _fts_write(conn, "r.id > ?", (first,))
+        _log_changes(conn, "r.id > ?", (first,))
+    return first
+
+def bulk_update_resources(values):
+    """Update existing rows by primary key from `values` (dicts with "id" plus
+    the columns to change, which may differ per dict) and keep the derived
+    tables in step. Runs in the current session transaction; the caller commits."""
+    if not values:
+        return
+    conn = db.session.connection()
+    with _triggers_suspended(conn, UPDATE_TRIGGERS):
+        _stage_ids(conn, (v["id"] for v in values))
+        _apply_cluster_delta(conn, _IN_BATCH, sign=-1)
+        _fts_write(conn, _IN_BATCH, delete=True)
+        db.session.execute(db.update(Resource), values)
+        _apply_cluster_delta(conn, _IN_BATCH)
+        _fts_write(conn, _IN_BATCH)
+        _log_changes(conn, _IN_BATCH)
+        conn.exec_driver_sql(f"DELETE FROM {RTREE} WHERE id IN (SELECT id FROM batch_ids)")
+        conn.exec_driver_sql(f"""
+            INSERT INTO {RTREE}
+            SELECT id, lon, lon, lat, lat FROM resource r
+            WHERE {_IN_BATCH} AND lat IS NOT NULL AND lon IS NOT NULL""")
+
+def bulk_delete_resources(ids):
+    """Delete rows by id along with their R*Tree, cluster and FTS entries.
+    Runs in the current session transaction; the caller commits."""
+    ids = list(ids)
+    if not ids:
+        return
+    conn = db.session.connection()
+    with _triggers_suspended(conn, DELETE_TRIGGERS):
+        _stage_ids(conn, ids)
+        _apply_cluster_delta(conn, _IN_BATCH, sign=-1)
+        _fts_write(conn, _IN_BATCH, delete=True)
+        _log_changes(conn, _IN_BATCH, op="delete")
+        conn.exec_driver_sql(f"DELETE FROM {RTREE} WHERE id IN (SELECT id FROM batch_ids)")
+        conn.exec_driver_sql("DELETE FROM resource WHERE id IN (SELECT id FROM batch_ids)")
+
+def _ensure_indexes():
+    # create_all() skips tables that already exist, indexes included
+    for index in Resource.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+
+# ── schema migrations ────────────────────────────────────
+# Applied in order, once per database, and recorded in schema_version, so a
+# worker or CLI starting against an up-to-date file pays for one SELECT.
+# Every step is idempotent: a database created before schema_version existed
+# replays them all harmlessly, as does a process racing another one here.
+# Schema changes (including new CLUSTER_MAX_ZOOM values) need a new entry.
+def _create_tables():
     db.create_all()
     _ensure_new_columns()
 
+MIGRATIONS = [
+    (1, "base tables and columns", _create_tables),
+    (2, "resource indexes",        _ensure_indexes),
+    (3, "R*Tree spatial index",    _ensure_spatial_index),
+    (4, "cluster aggregates",      _ensure_cluster_aggregates),
+    (5, "dataset version",         _ensure_dataset_version),
+    (6, "FTS5 search index",       _ensure_search_index),
+    (7, "chat sessions",           lambda: ChatSession.__table__.create(bind=db.engine, checkfirst=True)),
+    (8, "resource change log",     _ensure_change_log),
+]
+
+def schema_version():
+    with _connect() as con:
+        try:
+            return con.execute("SELECT coalesce(max(version), 0) FROM schema_version").fetchone()[0]
+        except sqlite3.OperationalError:        # no schema_version table yet
+            return 0
+
+def migrate():
+    """Apply pending MIGRATIONS; returns the names of the steps that ran.
+    Must run inside an app context."""
+    current = schema_version()
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step()
+        with _connect() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+                               version INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                               applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)""")
+            con.execute("INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+        applied.append(name)
+    return applied
+
+# ── app factory ──────────────────────────────────────────
+def create_app(config=None):
+    """Build the Flask app; `config` overrides DEFAULT_CONFIG (e.g. another
+    SQLALCHEMY_DATABASE_URI). Pending migrations run before it returns, and
+    the time taken is kept in app.config["STARTUP_SECONDS"], and the time since
+    the process started (imports included) in PROCESS_STARTUP_SECONDS. Both
+    are logged at INFO; set LOG_LEVEL=WARNING to silence them."""
+    started = time.perf_counter()
+    app = Flask(__name__, static_folder="static", template_folder="templates")
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    if _is_file_db(app.config["SQLALCHEMY_DATABASE_URI"]):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {**DB_POOL_OPTIONS,
+                                                   **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})}
+    if LOG_FORMAT == "json":
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonLogFormatter())
+        app.logger.handlers[:] = [handler]
+    app.logger.setLevel(LOG_LEVEL)
+    db.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+    with app.app_context():
+        applied = migrate()
+    app.config["STARTUP_SECONDS"] = time.perf_counter() - started
+    app.config["PROCESS_STARTUP_SECONDS"] = process_age() or app.config["STARTUP_SECONDS"]
+    if applied:
+        app.logger.info("Applied migrations: %s", ", ".join(applied))
+    app.logger.info("Ready %.0f ms after process start (create_app %.0f ms)",
+                    1000 * app.config["PROCESS_STARTUP_SECONDS"], 1000 * app.config["STARTUP_SECONDS"])
+    return app
+
 @login_manager.user_loader
 def load_user(uid): return db.session.get(User, int(uid))
 
+@bp.before_app_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    g.sql_queries, g.sql_seconds = 0, 0.0
+
+@bp.after_app_request
+def _record_request(resp):
+    if "request_started" not in g:
+        return resp
+    elapsed = time.perf_counter() - g.request_started
+    metrics.observe("http_request_seconds", elapsed, endpoint=_endpoint_label(),
+                    method=request.method, status=resp.status_code)
+    if LOG_FORMAT == "json":
+        current_app.logger.info("request", extra={"fields": {
+            "method": request.method, "path": request.path, "endpoint": request.endpoint,
+            "status": resp.status_code, "duration_ms": round(1000 * elapsed, 2),
+            "sql_queries": g.sql_queries, "sql_ms": round(1000 * g.sql_seconds, 2),
+            **({"phases_ms": g.phases} if "phases" in g else {})}})
+    return resp
+
+@bp.route("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape target (text exposition format 0.0.4)."""
+    samples = [
+        ("app_startup_seconds", "gauge", "create_app duration for this process", {},
+         current_app.config.get("STARTUP_SECONDS", 0.0)),
+        ("process_startup_seconds", "gauge", "process start to app ready, imports included", {},
+         current_app.config.get("PROCESS_STARTUP_SECONDS", 0.0)),
+        ("dataset_version", "gauge", "Current dataset_version counter", {}, response_cache.version()),
+        ("response_cache_entries", "gauge", "Cached read responses held by this worker", {},
+         len(response_cache._entries)),
+        *(("response_cache_lookups_total", "counter", "Read-response cache lookups by result",
+           {"result": result}, n) for result, n in (("hit", response_cache.hits),
+                                                    ("miss", response_cache.misses))),
+        *(("chat_intent_total", "counter", "Chat intent extractions by source", {"source": source}, n)
+          for source, n in intent_extractor.stats.items()),
+    ]
+    if llm:
+        samples += [("llm_active", "gauge", "LLM generations in flight", {}, llm.active),
+                    ("llm_waiting", "gauge", "LLM requests queued for a slot", {}, llm.waiting)]
+    return Response(metrics.render(samples), mimetype="text/plain; version=0.0.4")
+
 # ── public endpoints ─────────────────────────────────────
-@app.route("/")
+@bp.route("/")
 def index(): return render_template("map.html")
 
-@app.route("/api/resources")
+@bp.route("/api/resources")
+@cached_json
 def api_resources():
     rtype = request.args.get("type")
     category = request.args.get("category")  # Keep for backwards compatibility
     q = Resource.query
+    if request.args.get("bbox"):
+        try:
+            bbox = _parse_bbox(request.args["bbox"], request.args.get("zoom", type=int))
+        except ValueError:
+            return {"error": "Bad bbox, expected minLon,minLat,maxLon,maxLat"}, 400
+        q = _in_bbox(q, bbox)
     if rtype:
         q = q.filter_by(type=rtype)
     if category:
         q = q.filter_by(category=category)
+    if wants_columnar():
+        # Marker essentials only; popups fetch /api/resources/<id> on demand
+        rows = q.with_entities(Resource.id, Resource.lat, Resource.lon,
+                               Resource.type, Resource.category).all()
+        return columnar_response([("id", "u32"), ("lat", "f32"), ("lon", "f32"),
+                                  ("type", "dict"), ("category", "dict")], rows)
     return jsonify([p.to_dict() for p in q.all()])
 
-@app.route("/api/categories")
+@bp.route("/api/resources/<int:pid>")
+@cached_json
+def api_resource(pid):
+    """Full details of one resource (lazy map popups)."""
+    return jsonify(Resource.query.get_or_404(pid).to_dict())
+
+CHANGE_STREAM_POLL      = 1.0   # seconds between dataset_version checks per stream
+CHANGE_STREAM_HEARTBEAT = 15.0  # idle seconds before a keep-alive comment
+CHANGE_STREAM_SECONDS   = 300.0 # streams close after this; EventSource reconnects with Last-Event-ID
+CHANGE_STREAM_RETRY_MS  = 2000
+
+def _parse_since(raw):
+    return None if raw in (None, "") else int(raw)
+
+@bp.route("/api/resources/changes")
+@cached_json
+def api_resource_changes():
+    """Change feed: ?since=<version>[&limit=] → the resources written or
+    deleted after that version, oldest first, each at most once:
+        {"version", "changes": [{"v", "op": "upsert"|"delete", "id", "resource"}], "more", "reset"}
+    Without since, only the current version: fetch it before a full listing
+    and poll or stream from there. Follow up with since=version while more is
+    true; reset=true means `since` is unknown here and the listing must be
+    reloaded. Only ?since= is read: the cache key covers the query string and
+    nothing else."""
+    try:
+        since = _parse_since(request.args.get("since"))
+    except ValueError:
+        return {"error": "since must be an integer version"}, 400
+    current = change_version()
+    if since is None or since > current:        # fresh client, or a version from another database
+        return jsonify({"version": current, "changes": [], "more": False, "reset": since is not None})
+    limit = max(1, min(request.args.get("limit", CHANGES_PAGE, type=int), CHANGES_PAGE_MAX))
+    changes, more = changes_since(since, limit)
+    return jsonify({"version": changes[-1]["v"] if changes else since,
+                    "changes": changes, "more": more, "reset": False})
+
+@bp.route("/api/resources/changes/stream")
+def api_resource_change_stream():
+    """Server-Sent Events over the change feed. Each "changes" event carries
+    a list of entries as above and its last version as the event id. A client
+    more than CHANGES_PAGE changes behind (e.g. after a CSV import), or with a
+    version this database never had, gets one "reset" event instead and should
+    reload its listing. A reconnecting EventSource resumes from the
+    Last-Event-ID it resends, ahead of ?since=. Every open stream holds a
+    server thread for up to CHANGE_STREAM_SECONDS, so it is meant for the few
+    admin pages; the public map polls the cached feed instead."""
+    try:
+        since = _parse_since(request.headers.get("Last-Event-ID") or request.args.get("since"))
+    except ValueError:
+        return {"error": "since must be an integer version"}, 400
+    current = change_version()
+    db.session.close()                  # don't hold a connection or snapshot across polls
+
+    def generate():
+        last, seen = current if since is None else since, None
+        deadline = time.monotonic() + CHANGE_STREAM_SECONDS
+        quiet_since = time.monotonic()
+        yield f"retry: {CHANGE_STREAM_RETRY_MS}\n\n"
+        while time.monotonic() < deadline:
+            version = response_cache.version()      # shared per process, re-read at most every second
+            if version != seen:
+                seen = version
+                changes, more = changes_since(last)
+                if more or last > change_version():
+                    last = change_version()
+                    metrics.inc("change_events_total", kind="reset")
+                    yield _sse("reset", {"version": last}, id=last)
+                elif changes:
+                    last = changes[-1]["v"]
+                    metrics.inc("change_events_total", kind="changes")
+                    yield _sse("changes", changes, id=last)
+                if changes:
+                    quiet_since = time.monotonic()
+            db.session.close()
+            if time.monotonic() - quiet_since > CHANGE_STREAM_HEARTBEAT:
+                quiet_since = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(CHANGE_STREAM_POLL)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@bp.route("/api/resources/clusters")
+@cached_json
+def api_resource_clusters():
+    """Grid clusters for zoomed-out views: one entry per cell with centroid,
+    total count and per-type counts, read from the precomputed aggregates."""
+    zoom = request.args.get("zoom", type=int)
+    if zoom is None:
+        return {"error": "zoom is required"}, 400
+    zoom = max(0, min(zoom, CLUSTER_MAX_ZOOM))
+    step = _cluster_step(zoom)
+
+    sql = "SELECT cx, cy, type, n, sum_lat, sum_lon FROM resource_cluster WHERE zoom = :zoom"
+    params = {"zoom": zoom}
+    if request.args.get("bbox"):
+        try:
+            min_lon, min_lat, max_lon, max_lat = _parse_bbox(request.args["bbox"])
+        except ValueError:
+            return {"error": "Bad bbox, expected minLon,minLat,maxLon,maxLat"}, 400
+        sql += " AND cx BETWEEN :cx0 AND :cx1 AND cy BETWEEN :cy0 AND :cy1"
+        params.update(cx0=int((min_lon + 180) // step), cx1=int((max_lon + 180) // step),
+                      cy0=int((min_lat + 90) // step), cy1=int((max_lat + 90) // step))
+    if request.args.get("type"):
+        sql += " AND type = :type"
+        params["type"] = request.args["type"]
+
+    cells = {}
+    for cx, cy, rtype, n, sum_lat, sum_lon in db.session.execute(db.text(sql), params):
+        c = cells.setdefault((cx, cy), {"cell": [cx, cy], "count": 0, "types": {},
+                                        "sum_lat": 0.0, "sum_lon": 0.0})
+        c["count"] += n
+        c["types"][rtype] = n
+        c["sum_lat"] += sum_lat
+        c["sum_lon"] += sum_lon
+    for c in cells.values():
+        c["lat"] = c.pop("sum_lat") / c["count"]
+        c["lon"] = c.pop("sum_lon") / c["count"]
+    return jsonify({"zoom": zoom, "clusters": list(cells.values())})
+
+@bp.route("/api/search")
+@cached_json
+def api_search():
+    """Ranked full-text search over name, description, city and category.
+    ?q= words match by prefix, ignoring case and diacritics; optional type=, limit=."""
+    match = _fts_match(request.args.get("q"))
+    if not match:
+        return {"error": "q is required"}, 400
+    limit = max(1, min(request.args.get("limit", 50, type=int), 200))
+    sql = (f"SELECT resource.* FROM {FTS} JOIN resource ON resource.id = {FTS}.rowid "
+           f"WHERE {FTS} MATCH :match")
+    params = {"match": match, "limit": limit}
+    if request.args.get("type"):
+        sql += " AND resource.type = :type"
+        params["type"] = request.args["type"]
+    # Name hits outrank city/category hits, which outrank description hits
+    sql += f" ORDER BY bm25({FTS}, 10.0, 1.0, 5.0, 3.0) LIMIT :limit"
+    rows = db.session.scalars(db.select(Resource).from_statement(db.text(sql)), params)
+    return jsonify([r.to_dict() for r in rows])
+
+NEARBY_OVERFETCH = 2    # rows read per result: the SQL order is equirectangular, not haversine
+
+@bp.route("/api/nearby")
+@cached_json
+def api_nearby():
+    """Resources within `radius` km of lat/lon (or of a city's centre), nearest
+    first. An R*Tree box prefilter narrows candidates, SQL orders and limits
+    them by approximate distance, and exact haversine ranks what is left.
+    ?lat=&lon=|city=, radius= (km, default 10), type=, min_capacity=, limit="""
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+    if (lat is None or lon is None) and request.args.get("city"):
+        center = city_center(request.args["city"])
+        if center is None:
+            return {"error": "Unknown city"}, 404
+        lat, lon = center
+    if lat is None or lon is None:
+        return {"error": "lat and lon (or city) are required"}, 400
+    radius = max(0.0, min(request.args.get("radius", 10.0, type=float), 500.0))
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+
+    filters = []
+    if request.args.get("type"):
+        filters.append(Resource.type == request.args["type"])
+    if request.args.get("min_capacity", type=int) is not None:
+        filters.append(Resource.capacity >= request.args.get("min_capacity", type=int))
+
+    # SQLite orders the candidates and cuts them to a few per result; the
+    # exact haversine only re-ranks and radius-filters that short list.
+    # Unfiltered, the R*Tree alone picks them.
+    bbox, n = _radius_bbox(lat, lon, radius), limit * NEARBY_OVERFETCH
+    if filters:
+        q = _in_bbox(Resource.query, bbox).filter(*filters)
+    else:
+        q = Resource.query.filter(Resource.id.in_(_nearest_ids(lat, lon, bbox, n)))
+    rows = (q.with_entities(*Resource.__table__.columns)
+            .order_by(_distance_order(lat, lon)).limit(n).all())
+    hits = sorted(((haversine_km(lat, lon, r.lat, r.lon), r) for r in rows), key=lambda h: h[0])
+    return jsonify({
+        "center": {"lat": lat, "lon": lon}, "radius_km": radius,
+        "results": [dict(r._asdict(), distance_km=round(d, 3))
+                    for d, r in hits if d <= radius][:limit],
+    })
+
+@bp.route("/api/categories")
+@cached_json
 def api_categories():
     """Get all distinct categories"""
     categories = db.session.query(Resource.category).filter(Resource.category.isnot(None)).distinct().all()
     return jsonify([cat[0] for cat in categories if cat[0]])
 
-@app.route("/api/resource-types")
+@bp.route("/api/resource-types")
+@cached_json
 def api_resource_types():
     """Get all distinct resource types"""
     types = db.session.query(Resource.type).filter(Resource.type.isnot(None)).distinct().all()
     return jsonify([t[0] for t in types if t[0]])
 
-@app.route("/api/all-resources")
+@bp.route("/api/all-resources")
+@cached_json
 def api_all_resources():
     """Get all resources for AI analysis - limited info to avoid token limits"""
+    if wants_columnar():
+        rows = db.session.query(Resource.id, Resource.type, Resource.category, Resource.city,
+                                Resource.capacity, Resource.name, Resource.description).all()
+        return columnar_response([("id", "u32"), ("type", "dict"), ("category", "dict"), ("city", "dict"),
+                                  ("capacity", "i32"), ("name", "str"), ("description", "str")], rows)
     resources = Resource.query.all()
     return jsonify([{
         'id': r.id,
@@ -151,35 +1306,146 @@ def api_all_resources():
     } for r in resources])
 
 # ── auth ─────────────────────────────────────────────────
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         u = User.query.filter_by(username=request.form["username"]).first()
         if u and check_password_hash(u.pw_hash, request.form["password"]):
             login_user(u)
-            return redirect(request.args.get("next") or url_for("admin_map"))
+            return redirect(request.args.get("next") or url_for(".admin_map"))
         flash("Invalid credentials", "error")
     return render_template("login.html")
 
-@app.route("/logout")
+@bp.route("/logout")
 @login_required
 def logout():
-    logout_user(); return redirect(url_for("login"))
+    logout_user(); return redirect(url_for(".login"))
 
 # ── admin pages ──────────────────────────────────────────
-@app.route("/admin/")
+@bp.route("/admin/")
 @login_required
 def admin_map(): return render_template("admin_map.html")
 
-@app.route("/admin/list")
+@bp.route("/admin/list")
 @login_required
 def admin_list(): return render_template("admin_list.html")
 
+# ── admin listing (keyset pagination) ───────────────────
+ADMIN_PAGE_MAX = 200
+_count_cache = OrderedDict()        # (dataset version, filters) → total
+
+def _encode_cursor(value, pid):
+    return base64.urlsafe_b64encode(json.dumps([value, pid]).encode()).decode()
+
+def _decode_cursor(raw):
+    value, pid = json.loads(base64.urlsafe_b64decode(raw.encode()))
+    return value, int(pid)
+
+def _after(col, value, pid, desc):
+    """Keyset conditions for rows after (value, pid) in ORDER BY col, id: a
+    list of branches to read in order, each one index range SQLite can
+    SEARCH. SQLite sorts NULLs first ascending and last descending, so the
+    NULL rows are their own branch rather than an OR, and the non-NULL one
+    is a row-value comparison (`a > ? OR (a = ? AND id > ?)` scans)."""
+    if col is Resource.id:
+        return [col < pid if desc else col > pid]
+    key = db.tuple_(col, Resource.id)
+    if not col.expression.nullable:     # no NULL branch to read (SQLite would scan for it)
+        return [key < db.tuple_(value, pid) if desc else key > db.tuple_(value, pid)]
+    if desc:
+        if value is None:
+            return [db.and_(col.is_(None), Resource.id < pid)]
+        return [key < db.tuple_(value, pid), col.is_(None)]
+    if value is None:
+        return [db.and_(col.is_(None), Resource.id > pid), col.isnot(None)]
+    return [key > db.tuple_(value, pid)]
+
+def _admin_page():
+    """Keyset-paginated listing: ?cursor=<opaque>|after_id=, limit=, sort=[-]column,
+    plus exact-match filters on any column (?city=Lugoj&type=Space).
+    Page cost stays flat however deep the cursor is."""
+    columns = Resource.__table__.columns
+    limit = max(1, min(request.args.get("limit", 50, type=int), ADMIN_PAGE_MAX))
+    sort = request.args.get("sort", "id")
+    desc = sort.startswith("-")
+    sort = sort.lstrip("-")
+    if sort not in columns:
+        return {"error": f"Unknown sort column: {sort}"}, 400
+    col = getattr(Resource, sort)
+
+    filters = []
+    try:
+        for name, raw in request.args.items():
+            if name in columns and raw != "":
+                filters.append((name, columns[name].type.python_type(raw)))
+    except ValueError:
+        return {"error": "Bad filter value"}, 400
+    q = Resource.query.filter_by(**dict(filters))
+
+    # Total per filter set, recomputed only when the dataset changes
+    key = (response_cache.version(), tuple(sorted(filters)))
+    total = _count_cache.get(key)
+    if total is None:
+        total = q.order_by(None).count()
+        _count_cache[key] = total
+        while len(_count_cache) > 256:
+            _count_cache.popitem(last=False)
+
+    branches = [db.true()]
+    try:
+        if request.args.get("cursor"):
+            value, pid = _decode_cursor(request.args["cursor"])
+            branches = _after(col, value, pid, desc)
+        elif request.args.get("after_id"):
+            if sort != "id":
+                return {"error": "after_id only applies to sort=id; use cursor"}, 400
+            pid = int(request.args["after_id"])
+            branches = _after(col, pid, pid, desc)
+    except (ValueError, TypeError):
+        return {"error": "Bad cursor"}, 400
+
+    order = (col.desc(), Resource.id.desc()) if desc else (col, Resource.id)
+    rows = []
+    for cond in branches:
+        rows += q.filter(cond).order_by(*order).limit(limit + 1 - len(rows)).all()
+        if len(rows) > limit:
+            break
+    items = [p.to_dict() for p in rows[:limit]]
+    next_cursor = _encode_cursor(items[-1][sort], items[-1]["id"]) if len(rows) > limit else None
+    return jsonify({"items": items, "total": total, "limit": limit, "next_cursor": next_cursor})
+
 # ── CRUD API ─────────────────────────────────────────────
-@app.route("/admin/api/resources", methods=["GET", "POST"])
+RESOURCE_FIELDS = ("name", "type", "city", "url", "category", "description", "contact")
+
+def _resource_values(d, create=False):
+    """JSON payload → Resource column values. A create fills every column and
+    needs name and type; an update only carries the keys present in `d`.
+    Raises KeyError/ValueError/TypeError on a bad payload."""
+    if not isinstance(d, dict):
+        raise TypeError("data must be an object")
+    if create:
+        d = {"lat": None, "lon": None, "capacity": None,
+             **{f: None for f in RESOURCE_FIELDS}, **d}
+        if not d["name"] or not d["type"]:
+            raise KeyError("name and type are required")
+    values = {f: d[f] for f in RESOURCE_FIELDS if f in d}
+    for f, v in values.items():
+        if v is not None and not isinstance(v, str):
+            raise TypeError(f"{f} must be a string")
+    if "name" in values and not values["name"] or "type" in values and not values["type"]:
+        raise ValueError("name and type cannot be empty")
+    # Handle lat/lon properly - convert None to 0.0 for non-localized resources
+    for f in ("lat", "lon"):
+        if f in d: values[f] = float(d[f]) if d[f] is not None else 0.0
+    if "capacity" in d: values["capacity"] = int(d["capacity"]) if d["capacity"] else None
+    return values
+
+@bp.route("/admin/api/resources", methods=["GET", "POST"])
 @login_required
 def admin_resources():
     if request.method == "GET":
+        if "cursor" in request.args or "after_id" in request.args:
+            return _admin_page()
         offset = request.args.get("offset", type=int)
         limit  = request.args.get("limit",  type=int)
         rtype = request.args.get("type")  # Changed from category to type
@@ -195,80 +1461,824 @@ def admin_resources():
 
     data = request.get_json(silent=True) or {}
     try:
-        # Handle lat/lon properly - convert None to 0.0 for non-localized resources
-        lat = data.get("lat")
-        lon = data.get("lon")
-        lat = float(lat) if lat is not None else 0.0
-        lon = float(lon) if lon is not None else 0.0
-
-        p = Resource(
-            name=data["name"], type=data["type"],
-            lat=lat, lon=lon,
-            category=data.get("category"),
-            city=data.get("city"), url=data.get("url"),
-            capacity=data.get("capacity"),
-            description=data.get("description"),
-            contact=data.get("contact")
-        )
-    except (KeyError, ValueError):
+        p = Resource(**_resource_values(data, create=True))
+    except (KeyError, ValueError, TypeError):
         return {"error": "Bad payload"}, 400
     db.session.add(p); db.session.commit()
+    response_cache.invalidate()
+    index_resources([p])
     return jsonify(p.to_dict()), 201
 
-@app.route("/admin/api/resources/<int:pid>", methods=["GET", "PUT", "DELETE"])
+@bp.route("/admin/api/resources/<int:pid>", methods=["GET", "PUT", "DELETE"])
 @login_required
 def admin_resource(pid):
     p = Resource.query.get_or_404(pid)
     if request.method == "GET":
         return jsonify(p.to_dict())
     if request.method == "PUT":
-        d = request.get_json(silent=True) or {}
-        for f in ("name", "type", "city", "url", "category", "description", "contact"):
-            if f in d: setattr(p, f, d[f])
-        # Handle lat/lon properly - convert None to 0.0 for non-localized resources
-        if "lat" in d: p.lat = float(d["lat"]) if d["lat"] is not None else 0.0
-        if "lon" in d: p.lon = float(d["lon"]) if d["lon"] is not None else 0.0
-        if "capacity" in d: p.capacity = int(d["capacity"]) if d["capacity"] else None
-        db.session.commit(); return jsonify(p.to_dict())
-    db.session.delete(p); db.session.commit(); return "", 204
+        try:
+            values = _resource_values(request.get_json(silent=True) or {})
+        except (KeyError, ValueError, TypeError):
+            return {"error": "Bad payload"}, 400
+        for f, v in values.items():
+            setattr(p, f, v)
+        db.session.commit(); response_cache.invalidate()
+        index_resources([p])
+        return jsonify(p.to_dict())
+    db.session.delete(p); db.session.commit(); response_cache.invalidate()
+    unindex_resources([pid])
+    return "", 204
+
+ADMIN_BATCH_MAX = 50_000
+SQL_IN_CHUNK    = 900               # ids per IN (...) list, under SQLite's bound-parameter limit
+
+def _id_chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), SQL_IN_CHUNK):
+        yield ids[i:i + SQL_IN_CHUNK]
+
+@bp.route("/admin/api/resources/batch", methods=["POST"])
+@login_required
+def admin_resources_batch():
+    """Mixed writes in one transaction:
+        {"operations": [{"op": "create", "data": {...}},
+                        {"op": "update", "id": 7, "data": {...}},
+                        {"op": "delete", "id": 9}, ...]}
+    Every operation is validated before anything is written, and the batch is
+    applied all-or-nothing: any invalid item → 400 and no changes. Results come
+    back in request order as {"index", "op", "id", "status"[, "error"]}.
+    Writes go through the set-based bulk_* helpers; the response cache and the
+    vector index are refreshed once for the whole batch."""
+    body = request.get_json(silent=True)
+    ops = body.get("operations") if isinstance(body, dict) else None
+    if not isinstance(ops, list) or not ops:
+        return {"error": "Expected a JSON object with a non-empty 'operations' list"}, 400
+    if len(ops) > ADMIN_BATCH_MAX:
+        return {"error": f"At most {ADMIN_BATCH_MAX} operations per batch"}, 413
+
+    results, creates, updates, deletes = [], [], [], []
+    targets = {}                        # id → index of the operation touching it
+    for i, item in enumerate(ops):
+        op = item.get("op") if isinstance(item, dict) else None
+        res = {"index": i, "op": op, "id": None, "status": None}
+        results.append(res)
+        try:
+            if op == "create":
+                creates.append((i, _resource_values(item.get("data") or {}, create=True)))
+                continue
+            if op not in ("update", "delete"):
+                raise ValueError("op must be create, update or delete")
+            pid = res["id"] = int(item["id"])
+            if pid in targets:
+                raise ValueError(f"id {pid} already used by operation {targets[pid]}")
+            targets[pid] = i
+            if op == "update":
+                values = _resource_values(item.get("data") or {})
+                if not values:
+                    raise ValueError("nothing to update")
+                updates.append((i, {"id": pid, **values}))
+            else:
+                deletes.append((i, pid))
+        except (KeyError, ValueError, TypeError) as e:
+            res.update(status=400, error=f"Bad payload: {e}")
+
+    # One lookup for every id the updates and deletes refer to
+    found = set()
+    for chunk in _id_chunks(targets):
+        found.update(db.session.scalars(db.select(Resource.id).where(Resource.id.in_(chunk))))
+    for pid in targets.keys() - found:
+        res = results[targets[pid]]
+        if res["status"] is None:
+            res.update(status=404, error="Not found")
+    if any(res["status"] for res in results):
+        return jsonify({"applied": False, "results": results}), 400
+
+    created = []
+    if creates:
+        first = bulk_insert_resources([values for _, values in creates])
+        created = db.session.scalars(
+            db.select(Resource.id).where(Resource.id > first).order_by(Resource.id)).all()
+    bulk_update_resources([values for _, values in updates])
+    bulk_delete_resources(pid for _, pid in deletes)
+    db.session.commit()
+
+    for (i, _), pid in zip(creates, created):
+        results[i].update(id=pid, status=201)
+    for i, _ in updates:
+        results[i]["status"] = 200
+    for i, _ in deletes:
+        results[i]["status"] = 204
+
+    response_cache.invalidate()
+    touched = created + [values["id"] for _, values in updates]
+    if touched:
+        index_resources(r for chunk in _id_chunks(touched)
+                        for r in Resource.query.filter(Resource.id.in_(chunk)))
+    if deletes:
+        unindex_resources([pid for _, pid in deletes])
+    return jsonify({"applied": True, "created": len(creates), "updated": len(updates),
+                    "deleted": len(deletes), "results": results})
+
+# ── LLM gateway ─────────────────────────────────────────
+class LLMBusy(Exception):
+    """The LLM request queue is full, or a request waited too long for a slot."""
+
+class LLMGateway:
+    """Async OpenAI client running on one background event loop, shared by
+    every Flask thread. At most `max_concurrency` generations hit the LLM
+    server at once; up to `max_queue` more wait in line and anything beyond
+    that is rejected with LLMBusy instead of piling up on the model."""
+
+    def __init__(self, base_url, model, max_concurrency=4, max_queue=32, queue_timeout=30.0):
+        self.base_url = base_url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._loop = None
+        self._lock = threading.Lock()
+        self.waiting = 0                # only touched on the loop thread
+        self.active = 0
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True).start()
+                from openai import AsyncOpenAI
+                self._client = AsyncOpenAI(base_url=self.base_url,
+                                           api_key="not-needed")  # Local LLM doesn't require API key
+                self._slots = asyncio.Semaphore(self.max_concurrency)
+                self._loop = loop
+        return self._loop
+
+    async def _acquire(self):
+        if not self._slots.locked():
+            await self._slots.acquire()     # a free slot is taken without suspending
+            metrics.observe("llm_queue_wait_seconds", 0.0)
+            self.active += 1
+            return
+        # Only callers that actually have to wait count against max_queue
+        if self.waiting >= self.max_queue:
+            raise LLMBusy("LLM queue is full")
+        self.waiting += 1
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMBusy("Timed out waiting for a free LLM slot")
+        finally:
+            self.waiting -= 1
+            metrics.observe("llm_queue_wait_seconds", time.perf_counter() - t0)
+        self.active += 1
+
+    def _release(self):
+        self.active -= 1
+        self._slots.release()
+
+    @staticmethod
+    def _record(mode, purpose, started, outcome, messages=None, reply=None, usage=None):
+        metrics.inc("llm_requests_total", mode=mode, purpose=purpose, outcome=outcome)
+        metrics.observe("llm_request_seconds", time.perf_counter() - started, mode=mode, purpose=purpose)
+        if outcome != "ok":
+            return
+        # Local servers don't always report usage (or not when streaming)
+        if usage is not None:
+            metrics.inc("llm_tokens_total", usage.prompt_tokens, purpose=purpose, kind="prompt")
+            metrics.inc("llm_tokens_total", usage.completion_tokens, purpose=purpose, kind="completion")
+        else:
+            metrics.inc("llm_tokens_total", ContextBuilder.count(messages), purpose=purpose, kind="prompt_estimated")
+            metrics.inc("llm_tokens_total", estimate_tokens(reply or ""), purpose=purpose, kind="completion_estimated")
+
+    async def _complete(self, messages, temperature, purpose):
+        started = time.perf_counter()
+        try:
+            await self._acquire()
+        except LLMBusy:
+            self._record("complete", purpose, started, "busy")
+            raise
+        try:
+            resp = await self._client.chat.completions.create(
+                model=self.model, messages=messages, temperature=temperature)
+        except Exception:
+            self._record("complete", purpose, started, "error")
+            raise
+        finally:
+            self._release()
+        reply = resp.choices[0].message.content
+        self._record("complete", purpose, started, "ok", messages, reply, getattr(resp, "usage", None))
+        return reply
+
+    async def _stream(self, messages, temperature, purpose, out):
+        started = time.perf_counter()
+        outcome, parts = "error", []
+        try:
+            try:
+                await self._acquire()
+            except LLMBusy:
+                outcome = "busy"
+                raise
+            out.put(_SLOT_ACQUIRED)
+            try:
+                stream = await self._client.chat.completions.create(
+                    model=self.model, messages=messages, temperature=temperature, stream=True)
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        if not parts:
+                            metrics.observe("llm_first_token_seconds", time.perf_counter() - started)
+                        parts.append(delta)
+                        out.put(delta)
+                outcome = "ok"
+            finally:
+                self._release()
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            out.put(e)
+        finally:
+            self._record("stream", purpose, started, outcome, messages, "".join(parts))
+            out.put(None)
+
+    def complete(self, messages, temperature=0.1, purpose="chat"):
+        """Blocking call: return the full reply text. `purpose` labels the metrics."""
+        fut = asyncio.run_coroutine_threadsafe(self._complete(messages, temperature, purpose),
+                                               self._ensure_loop())
+        return fut.result()
+
+    def stream(self, messages, temperature=0.3, purpose="chat"):
+        """Block until a generation slot is free (raising LLMBusy like complete()
+        does), then return a ReplyStream of reply text deltas. Acquiring up
+        front lets callers turn overload into a 503 before they start a
+        streaming response."""
+        out = queue.Queue()
+        fut = asyncio.run_coroutine_threadsafe(self._stream(messages, temperature, purpose, out),
+                                               self._ensure_loop())
+        first = out.get()
+        if isinstance(first, Exception):
+            raise first
+        return ReplyStream(out, fut)
+
+_SLOT_ACQUIRED = object()
+
+class ReplyStream:
+    """Iterator over streamed reply deltas. close() (also on exhaustion or
+    error) cancels the generation, e.g. when the client went away."""
+
+    def __init__(self, out, fut):
+        self._out, self._fut = out, fut
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self._out.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        self._fut.cancel()
+
+llm = LLMGateway(LLM_BASE_URL, LLM_MODEL, LLM_MAX_CONCURRENCY,
+                 LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT) if HAS_OPENAI else None
+
+def _sse(event, payload, id=None):
+    return (f"id: {id}\n" if id is not None else "") + f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+# ── chat intent extraction ──────────────────────────────
+# Keyword → resource type, matched against the normalized (lowercase,
+# diacritic-free) message. English and Romanian stems.
+TYPE_KEYWORDS = {
+    "Space":                 ("venue", "hall", "room", "space", "location", "sala", "spatiu", "loc pentru"),
+    "Volunteer":             ("volunteer", "ngo", "voluntar", "ong", "student organi"),
+    "Grant":                 ("grant", "funding", "fund", "sponsorship", "finantare", "bani"),
+    "Event":                 ("event", "conference", "festival", "networking", "meetup", "eveniment"),
+    "Participatory Program": ("participatory", "civic", "community program", "bugetare"),
+    "Project":               ("project", "infrastructure", "proiect"),
+    "Partner":               ("partner", "company", "companies", "institution", "sponsor", "partener"),
+    "Logistics":             ("catering", "equipment", "transport", "logistic", "sound", "chairs"),
+}
+ALL_TYPES_KEYWORDS = ("everything", "all resources", "what's available", "whats available",
+                      "what is available", "anything", "help with event", "ce resurse")
+CAPACITY_RE = re.compile(
+    r"\b(\d{1,6})\s*(?:people|persons|participants|guests|attendees|pax|seats|persoane|oameni|locuri)\b"
+    r"|\b(?:capacity(?: of)?|for|pentru)\s+(\d{1,6})\b")
+
+# Combining diacritical mark blocks, stripped after NFKD decomposition
+_COMBINING_RE = re.compile("[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]")
+
+def _normalize(text):
+    text = _COMBINING_RE.sub("", unicodedata.normalize("NFKD", text or "")).lower()
+    return " ".join(re.sub(r"[^\w\s']", " ", text).split())
+
+class IntentExtractor:
+    """Fills {"city", "capacity", "buckets"} without the LLM when possible.
+
+    Rules come first: known Resource.city names, capacity numbers and type
+    keywords. Failing that, an LRU+TTL cache of earlier LLM extractions keyed
+    on the normalized message plus a hash of the last few turns. The LLM is
+    called only when both miss."""
+
+    def __init__(self, max_entries=2048, ttl=3600, history_turns=4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.history_turns = history_turns
+        self._entries = OrderedDict()       # key → (expires_at, analysis)
+        self._cities = (None, {})           # (dataset version, normalized → canonical)
+        self._lock = threading.Lock()
+        self.stats = {"rules": 0, "cache": 0, "llm": 0, "llm_failed": 0}
+        self.seconds = {"rules": 0.0, "cache": 0.0, "llm": 0.0}
+
+    def known_cities(self):
+        version = response_cache.version()
+        if self._cities[0] != version:
+            rows = db.session.query(Resource.city).filter(Resource.city.isnot(None)).distinct()
+            self._cities = (version, {_normalize(c): c for (c,) in rows if c and c.strip()})
+        return self._cities[1]
+
+    def parse(self, user_msg, history, available_types):
+        """Rule-based extraction; None unless the result is unambiguous."""
+        text = _normalize(user_msg)
+        city = next((canon for norm, canon in sorted(self.known_cities().items(), key=lambda kv: -len(kv[0]))
+                     if re.search(rf"\b{re.escape(norm)}\b", text)), None)
+        m = CAPACITY_RE.search(text)
+        capacity = int(m.group(1) or m.group(2)) if m else None
+
+        if any(k in text for k in ALL_TYPES_KEYWORDS):
+            buckets = list(available_types)
+        else:
+            buckets = [t for t, words in TYPE_KEYWORDS.items()
+                       if t in available_types and any(re.search(rf"\b{re.escape(w)}", text) for w in words)]
+        # Follow-ups ("and in Lugoj?") lean on history the rules can't read
+        if not buckets or (history and city is None):
+            return None
+        return {"city": city, "capacity": capacity, "buckets": buckets}
+
+    def _key(self, user_msg, history):
+        recent = [(m.get("role"), m.get("content")) for m in history[-self.history_turns:]]
+        digest = hashlib.blake2b(json.dumps(recent).encode(), digest_size=8).hexdigest()
+        return _normalize(user_msg), digest
+
+    def extract(self, user_msg, history, available_types, ask_llm):
+        """Return an analysis dict (a fresh copy) or None if the LLM answer was unusable."""
+        t0 = time.perf_counter()
+        analysis = self.parse(user_msg, history, available_types)
+        source = "rules"
+        if analysis is None:
+            key = self._key(user_msg, history)
+            with self._lock:
+                hit = self._entries.get(key)
+                if hit and hit[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    analysis, source = hit[1], "cache"
+            if analysis is None:
+                source = "llm"
+                analysis = ask_llm()
+                if analysis is None:
+                    self.stats["llm_failed"] += 1
+                else:
+                    with self._lock:
+                        self._entries[key] = (time.monotonic() + self.ttl, analysis)
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+        self.stats[source] += 1
+        self.seconds[source] += time.perf_counter() - t0
+        if analysis is None:
+            return None
+        return {**analysis, "buckets": list(analysis.get("buckets") or [])}
+
+    def metrics(self):
+        total = sum(self.stats[s] for s in ("rules", "cache", "llm"))
+        return {
+            "requests": total,
+            "by_source": dict(self.stats),
+            "llm_calls_saved": self.stats["rules"] + self.stats["cache"],
+            "hit_rate": round((self.stats["rules"] + self.stats["cache"]) / total, 4) if total else 0.0,
+            "avg_ms": {s: round(1000 * self.seconds[s] / self.stats[s], 3)
+                       for s in self.seconds if self.stats[s]},
+            "cache_entries": len(self._entries),
+        }
+
+intent_extractor = IntentExtractor()
+
+# ── chat prompt assembly ────────────────────────────────
+def estimate_tokens(text):
+    """Rough token count (~4 chars/token); good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+RESOURCE_COLUMNS = ("name", "city", "distance_km", "capacity", "category", "contact", "url", "description")
+
+class ContextBuilder:
+    """Fits conversation history and retrieved resources into a prompt budget.
+
+    The newest turns are kept verbatim up to `history_share` of the budget;
+    older ones collapse into a one-line-per-turn summary. Resources render as
+    pipe-separated rows under one header, and rows are dropped from the
+    largest buckets first when the rest of the budget runs out."""
+
+    def __init__(self, budget=6000, history_share=0.35, summary_chars=160, description_chars=120):
+        self.budget = budget
+        self.history_share = history_share
+        self.summary_chars = summary_chars
+        self.description_chars = description_chars
+
+    def history(self, conversation_history):
+        """→ (messages, stats) for the user/assistant turns that fit."""
+        turns = [{"role": m["role"], "content": m.get("content") or ""}
+                 for m in conversation_history if m.get("role") in ("user", "assistant")]
+        limit = int(self.budget * self.history_share)
+        kept, used = [], 0
+        for m in reversed(turns):
+            cost = estimate_tokens(m["content"]) + 4
+            if used + cost > limit:
+                break
+            kept.append(m)
+            used += cost
+        kept.reverse()
+        older = turns[:len(turns) - len(kept)]
+
+        messages = []
+        if older:
+            lines = [self.summary_line(m) for m in older]
+            # Keep the most recent summary lines if even the summary is too long
+            while lines and estimate_tokens("\n".join(lines)) > max(limit - used, limit // 4):
+                lines.pop(0)
+            if lines:
+                messages.append({"role": "system",
+                                 "content": "Summary of earlier conversation:\n" + "\n".join(lines)})
+        messages.extend(kept)
+        return messages, {"history_turns": len(turns), "history_kept": len(kept),
+                          "history_summarized": len(older)}
+
+    def summary_line(self, m):
+        return f"- {m['role']}: {' '.join(m['content'].split())[:self.summary_chars]}"
+
+    def session_history(self, summary, turns):
+        """→ (messages, stats) for a server-side conversation: its rolling
+        summary and verbatim turns as stored, so consecutive prompts share a
+        prefix the LLM server can keep cached. Falls back to history() if
+        the stored turns outgrew the budget."""
+        messages = [{"role": "system", "content": "Summary of earlier conversation:\n" + "\n".join(summary)}
+                    ] if summary else []
+        messages += [{"role": t["role"], "content": t["content"]} for t in turns]
+        if self.count(messages) > int(self.budget * self.history_share):
+            return self.history(turns)
+        return messages, {"history_turns": len(summary) + len(turns), "history_kept": len(turns),
+                          "history_summarized": len(summary)}
+
+    def _row(self, r):
+        cells = []
+        for col in RESOURCE_COLUMNS:
+            v = r.get(col)
+            v = "" if v is None else " ".join(str(v).split())
+            if col == "description" and len(v) > self.description_chars:
+                v = v[:self.description_chars - 1] + "…"
+            cells.append(v.replace("|", "/"))
+        return "|".join(cells)
+
+    def resources(self, results, budget):
+        """→ (text, stats): `results` as dense tables trimmed to `budget` tokens."""
+        rows = {t: [self._row(r) for r in items] for t, items in results.items()}
+        cost = {t: [estimate_tokens(line) + 1 for line in lines] for t, lines in rows.items()}
+        header = "|".join(RESOURCE_COLUMNS)
+        total = estimate_tokens(header) + sum(sum(c) + 4 for c in cost.values())
+        dropped = 0
+        while total > budget and any(cost.values()):
+            t = max(cost, key=lambda k: len(cost[k]))
+            total -= cost[t].pop()
+            rows[t].pop()
+            dropped += 1
+        blocks = [f"[{t}] {len(lines)} rows\n" + "\n".join(lines) if lines else f"[{t}] none found"
+                  for t, lines in rows.items()]
+        return header + "\n" + "\n".join(blocks), {"resources_rendered": sum(len(v) for v in rows.values()),
+                                                   "resources_dropped": dropped}
+
+    @staticmethod
+    def count(messages):
+        return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+context_builder = ContextBuilder(CHAT_PROMPT_TOKENS)
+
+# ── chat sessions ───────────────────────────────────────
+class ConversationStore:
+    """Conversations kept in the chat_session table, so every worker sees
+    them and clients send only the new message.
+
+    Each holds at most `max_turns` verbatim turns. Past that, the oldest half
+    is folded into a rolling one-line-per-turn summary (capped at
+    `summary_lines`), so the prompt prefix changes once per fold rather than
+    on every turn. Conversations idle for `ttl` seconds expire, and only the
+    `max_sessions` most recently used are kept."""
+
+    def __init__(self, ttl=3600, max_sessions=5000, max_turns=12, summary_lines=40):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.summary_lines = summary_lines
+
+    def load(self, sid):
+        """→ (session id, summary lines, turns). Unknown or expired ids start
+        a new conversation under a fresh id."""
+        row = db.session.get(ChatSession, sid) if sid else None
+        if row is not None and row.updated_at >= time.time() - self.ttl:
+            metrics.inc("chat_sessions_total", event="resumed")
+            return row.id, json.loads(row.summary), json.loads(row.turns)
+        metrics.inc("chat_sessions_total", event="expired" if row is not None else "created")
+        return secrets.token_urlsafe(16), [], []
+
+    def save(self, sid, summary, turns, user_msg, reply):
+        turns = [*turns, {"role": "user", "content": user_msg}, {"role": "assistant", "content": reply}]
+        if len(turns) > self.max_turns:
+            fold = max(2, len(turns) - self.max_turns // 2)
+            summary = [*summary, *(context_builder.summary_line(t) for t in turns[:fold])][-self.summary_lines:]
+            turns = turns[fold:]
+        now = time.time()
+        db.session.merge(ChatSession(id=sid, summary=json.dumps(summary, ensure_ascii=False),
+                                     turns=json.dumps(turns, ensure_ascii=False), updated_at=now))
+        db.session.execute(db.delete(ChatSession).where(ChatSession.updated_at < now - self.ttl))
+        db.session.execute(db.delete(ChatSession).where(ChatSession.id.in_(
+            db.select(ChatSession.id).order_by(ChatSession.updated_at.desc())
+              .offset(self.max_sessions))))
+        db.session.commit()
+
+    def drop(self, sid):
+        db.session.execute(db.delete(ChatSession).where(ChatSession.id == sid))
+        db.session.commit()
+
+conversations = ConversationStore(CHAT_SESSION_TTL, CHAT_MAX_SESSIONS, CHAT_SESSION_TURNS)
+
+# ── semantic index ──────────────────────────────────────
+# Hashed TF-IDF vectors over name, description, category, city and type
+# (semantic_index.py), memory-mapped next to the database in <db>.index/.
+# build_index.py builds it offline; CRUD handlers and import_csv.py keep it
+# current. Without numpy or a built index, chat uses the type tiers only.
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+STOPWORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "can", "do", "for", "from", "have", "i", "in", "is", "it",
+    "me", "my", "need", "of", "on", "or", "some", "the", "to", "we", "what", "with", "you", "any",
+    "al", "ale", "ai", "care", "cu", "de", "din", "este", "in", "la", "mai", "o", "pe", "pentru",
+    "sa", "si", "sau", "un", "una", "unei", "unui"))
+_TYPE_PATTERNS = {t: re.compile(r"\b(?:" + "|".join(re.escape(w) for w in words) + ")")
+                  for t, words in TYPE_KEYWORDS.items()}
+_vector_indexes = {}                # index directory → VectorIndex
+
+def _semantic_features(text):
+    """Normalized words minus stopwords and numbers (capacities are filtered,
+    not matched), 5-letter stems for Romanian and English inflections, and a
+    type:<Type> feature for every TYPE_KEYWORDS hit."""
+    words = [w for w in _normalize(text).split() if len(w) > 1 and w not in STOPWORDS and not w.isdigit()]
+    joined = " ".join(words)
+    return (words + [w[:5] for w in words if len(w) > 5]
+            + [f"type:{t}" for t, pattern in _TYPE_PATTERNS.items() if pattern.search(joined)])
+
+def _resource_features(r):
+    text = " ".join(v for v in (r.name, r.description, r.category, r.city) if v)
+    return _semantic_features(text) + [f"type:{r.type}"] * 2
+
+def _vector_index_path():
+    return Path(db.engine.url.database).with_suffix(".index")
+
+def vector_index():
+    """This database's VectorIndex, or None until it is built (or without
+    numpy, or for an in-memory database, which has no file to sit next to)."""
+    if not HAS_NUMPY or not _is_file_db(db.engine.url):
+        return None
+    path = _vector_index_path()
+    index = _vector_indexes.get(path)
+    if index is None:
+        from semantic_index import VectorIndex
+        index = _vector_indexes[path] = VectorIndex(path)
+    return index if index.exists() else None
+
+def build_vector_index(batch=5000):
+    """Rebuild the index from the resource table; returns the rows indexed
+    (none for an in-memory database)."""
+    if not _is_file_db(db.engine.url):
+        return 0
+    from semantic_index import VectorIndex
+    path = _vector_index_path()
+    index = _vector_indexes.setdefault(path, VectorIndex(path))
+    version = db.session.execute(db.text("SELECT version FROM dataset_version")).scalar()
+    rows = db.session.query(Resource.id, Resource.name, Resource.description, Resource.category,
+                            Resource.city, Resource.type).yield_per(batch)
+    return index.build(((r.id, _resource_features(r)) for r in rows), version=version)
+
+def sync_vector_index():
+    """Index rows the index lacks and drop ids no longer in the table (writes
+    made outside the app). Edits to indexed rows need a rebuild."""
+    index = vector_index()
+    if index is None:
+        return build_vector_index(), 0
+    indexed = index.indexed_ids()
+    current = {pid for (pid,) in db.session.query(Resource.id)}
+    missing, gone = current - indexed, indexed - current
+    if missing:
+        index_resources(Resource.query.filter(Resource.id.in_(missing)).yield_per(5000))
+    if gone:
+        unindex_resources(gone)
+    return len(missing), len(gone)
+
+def index_resources(resources):
+    """Add or refresh resources in the vector index (after their commit).
+    A failure is logged rather than failing the write that triggered it."""
+    try:
+        index = vector_index()
+        if index is None:
+            return
+        index.upsert(((r.id, _resource_features(r)) for r in resources), version=response_cache.version())
+    except Exception:
+        current_app.logger.exception("Vector index update failed")
+
+def unindex_resources(pids):
+    try:
+        index = vector_index()
+        if index is None:
+            return
+        index.remove(pids, version=response_cache.version())
+    except Exception:
+        current_app.logger.exception("Vector index update failed")
+
+# ── chat retrieval ──────────────────────────────────────
+CHAT_ROWS_PER_TYPE   = 15
+CHAT_SAFETY_NET_ROWS = 50
+CHAT_NEARBY_KM       = 15.0         # radius around a resolved city centre
+CHAT_SEMANTIC_ROWS   = 20           # rows the semantic path puts in the prompt
+CHAT_SEMANTIC_MIN    = 3            # fewer usable hits → fall back to the type tiers
+CHAT_SEMANTIC_FLOOR  = 0.4          # hits scoring under this share of the best one are dropped
+_overview = (None, None)            # (dataset version, (total, breakdown, types))
+
+def _db_overview():
+    """Total count, per-type counts and available types from one GROUP BY,
+    recomputed only when the dataset version changes."""
+    global _overview
+    version = response_cache.version()
+    if _overview[0] != version:
+        rows = db.session.query(Resource.type, db.func.count(Resource.id)).group_by(Resource.type).all()
+        breakdown = {t: n for t, n in rows}
+        _overview = (version, (sum(breakdown.values()), breakdown, [t for t in breakdown if t]))
+    return _overview[1]
+
+def _top_per_type(city=None, capacity=None, per_type=CHAT_ROWS_PER_TYPE, near=None):
+    """{type: [Resource, ...]} holding up to `per_type` rows of every type from
+    a single ROW_NUMBER() OVER (PARTITION BY type) query. Ordered by name, or
+    by distance when `near` = (lat, lon, radius_km) is given; then rows within
+    the radius also qualify alongside the city-name matches."""
+    order = (_distance_order(near[0], near[1]), Resource.name) if near else (Resource.name,)
+    rn = db.func.row_number().over(partition_by=Resource.type, order_by=order).label("rn")
+    ranked = db.select(Resource.id.label("id"), rn)
+    city_match = _fts_match(city, column="city")
+    if near:
+        in_radius = Resource.id.in_(_bbox_ids(_radius_bbox(*near)))
+        ranked = ranked.where(db.or_(in_radius, Resource.id.in_(_fts_ids(city_match))) if city_match
+                              else in_radius)
+    elif city_match:
+        # Diacritic-insensitive city match through the FTS index, not a LIKE scan
+        ranked = ranked.where(Resource.id.in_(_fts_ids(city_match)))
+    if capacity:
+        # Capacity only constrains spaces
+        ranked = ranked.where(db.or_(Resource.type != "Space", Resource.capacity >= capacity))
+    ranked = ranked.subquery()
+    q = (db.select(Resource).join(ranked, Resource.id == ranked.c.id)
+           .where(ranked.c.rn <= per_type).order_by(Resource.type, ranked.c.rn))
+    grouped = {}
+    for r in db.session.scalars(q):
+        grouped.setdefault(r.type, []).append(r)
+    return grouped
+
+def semantic_retrieve(query, analysis, center=None):
+    """Up to CHAT_SEMANTIC_ROWS resources closest to `query` in the vector
+    index, best first, honouring the buckets of a pointed intent, capacity
+    (spaces only) and, when enough hits are there, the city. Hits scoring
+    under CHAT_SEMANTIC_FLOOR of the best remaining one are dropped. None when
+    the index is missing or finds too little."""
+    index = vector_index()
+    if index is None:
+        return None
+    features = _semantic_features(query)
+    buckets = analysis.get("buckets") or []
+    pointed = 0 < len(buckets) <= 3     # not the all-types fallback
+    if pointed:
+        features += [f"type:{b}" for b in buckets]
+    scores = dict(index.search(features, k=CHAT_SEMANTIC_ROWS * 4))
+    if not scores:
+        return None
+    rows = Resource.query.filter(Resource.id.in_(scores)).all()
+    if pointed:
+        rows = [r for r in rows if r.type in buckets]
+    if analysis.get("capacity"):
+        rows = [r for r in rows if r.type != "Space" or (r.capacity or 0) >= analysis["capacity"]]
+    if analysis.get("city"):
+        city = _normalize(analysis["city"])
+        local = [r for r in rows if _normalize(r.city) == city
+                 or (center and r.lat is not None and r.lon is not None
+                     and haversine_km(center[0], center[1], r.lat, r.lon) <= CHAT_NEARBY_KM)]
+        if len(local) >= CHAT_SEMANTIC_MIN:
+            rows = local
+    if rows:
+        floor = CHAT_SEMANTIC_FLOOR * max(scores[r.id] for r in rows)
+        rows = sorted((r for r in rows if scores[r.id] >= floor), key=lambda r: -scores[r.id])
+    return rows[:CHAT_SEMANTIC_ROWS] if len(rows) >= CHAT_SEMANTIC_MIN else None
+
+def retrieve_for_chat(analysis, available_types, query=None):
+    """Resources for the reply prompt, grouped by type. With a vector index,
+    the rows semantically closest to `query` (the user message); otherwise,
+    or if that finds too little, tiers:
+    1. the requested buckets, filtered by city/capacity;
+    2. if that yields < 3 rows, every type that has filtered matches;
+    3. if nothing matched at all, the first rows by name, unfiltered.
+    Tiers 1-2 share one query; tier 3 costs a second one. When the city
+    resolves to coordinates, rows near it rank by distance and carry
+    distance_km. Updates analysis["buckets"] when falling back, as the reply
+    reports it."""
+    center = city_center(analysis["city"]) if analysis.get("city") else None
+
+    def as_dict(r):
+        d = r.to_dict()
+        if center and r.lat is not None and r.lon is not None:
+            d["distance_km"] = round(haversine_km(center[0], center[1], r.lat, r.lon), 1)
+        return d
+
+    hits = semantic_retrieve(query, analysis, center) if query else None
+    metrics.inc("chat_retrieval_total", method="semantic" if hits else "tiers")
+    if hits:
+        results = {}
+        for r in hits:
+            results.setdefault(r.type or "Other", []).append(as_dict(r))
+        analysis["buckets"] = list(results)
+        return results
+
+    near = (*center, CHAT_NEARBY_KM) if center else None
+    top = _top_per_type(analysis.get("city"), analysis.get("capacity"), near=near)
+
+    results = {b: [as_dict(r) for r in top.get(b, [])] for b in analysis.get("buckets", [])}
+    total_found = sum(len(v) for v in results.values())
+
+    # Fallback: if no buckets were selected or very few results found, show all types
+    if not analysis.get("buckets") or total_found < 3:
+        current_app.logger.info("Fallback triggered: buckets=%s, total_found=%s", analysis.get("buckets"), total_found)
+        analysis["buckets"] = list(available_types)
+        results = {t: [as_dict(r) for r in top[t]] for t in available_types if top.get(t)}
+
+    # Final safety net: if still no results, get everything
+    if not results:
+        current_app.logger.info("Final safety net: getting all resources")
+        for r in Resource.query.order_by(Resource.name).limit(CHAT_SAFETY_NET_ROWS):
+            results.setdefault(r.type or "Other", []).append(r.to_dict())
+        analysis["buckets"] = list(results.keys())
+    return results
 
 # ── AI Chat functionality ───────────────────────────────
-@app.route("/chat")
+@bp.route("/chat")
 def chat_page():
     return render_template("chat.html")
 
-@app.route("/api/chat", methods=["POST"])
+@bp.route("/api/chat/metrics")
+def chat_metrics():
+    """Intent fast-path / cache hit rates and latency per source."""
+    return jsonify({"intent": intent_extractor.metrics()})
+
+@bp.route("/api/chat/sessions/<sid>", methods=["DELETE"])
+def chat_session_delete(sid):
+    """Forget a conversation (the chat page's Clear button)."""
+    conversations.drop(sid)
+    return "", 204
+
+@bp.route("/api/chat", methods=["POST"])
 def chat_api():
-    if not client:
+    if not llm:
         return jsonify({"error": "AI chat not available. Please install the openai package and ensure your local LLM server is running."}), 503
 
     data = request.get_json(silent=True) or {}
     user_msg = data.get("message", "")
-    conversation_history = data.get("history", [])  # Get conversation history
+    # Clients send only the new message plus session_id; a full "history"
+    # without one is still accepted (stateless, nothing stored)
+    session_id = data.get("session_id")
+    stateless = "history" in data and not session_id
+    stream = bool(data.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
 
     if not user_msg:
         return jsonify({"error": "No message provided"}), 400
 
     try:
-        # Get database overview for better AI context
-        total_resources = Resource.query.count()
-        resource_summary = db.session.query(
-            Resource.type,
-            db.func.count(Resource.id).label('count')
-        ).group_by(Resource.type).all()
+        if stateless:
+            summary, conversation_history = [], data.get("history") or []
+        else:
+            session_id, summary, conversation_history = conversations.load(session_id)
 
-        # Create resource summary for AI context
-        resource_breakdown = {c: count for c, count in resource_summary}
-
-        # Get all available resource types from database dynamically
-        available_types = db.session.query(Resource.type).filter(Resource.type.isnot(None)).distinct().all()
-        available_types = [t[0] for t in available_types if t[0]]
+        # Database overview for better AI context (cached per dataset version)
+        with timed_phase("overview"):
+            total_resources, resource_breakdown, available_types = _db_overview()
 
         # 1. Ask LLM to extract intent with conversation context
         sys_prompt = f"""You are an assistant that extracts structured needs from users planning events in Timiș county, Romania.
 
 Database Overview: We have {total_resources} total resources with the following breakdown:
-{json.dumps(resource_breakdown, indent=2)}
+{json.dumps(resource_breakdown, separators=(",", ":"), ensure_ascii=False)}
 
 Available resource types in our database: {available_types}
 
@@ -298,113 +2308,62 @@ IMPORTANT:
 
 Return ONLY the JSON object, no additional text or explanation."""
 
-        # Build messages with conversation history
-        messages = [{"role": "system", "content": sys_prompt}]
-
-        # Add conversation history
-        for msg in conversation_history:
-            if msg.get("role") in ["user", "assistant"]:
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-
-        # Add current user message
-        messages.append({"role": "user", "content": user_msg})
-
-        analysis_response = client.chat.completions.create(
-            model="qwen/qwen3-14b",
-            messages=messages,
-            temperature=0.1
-        )
-
-        # Parse the analysis response
-        try:
-            response_content = analysis_response.choices[0].message.content.strip()
-            # Try to extract JSON if the response contains extra text
-            if not response_content.startswith('{'):
-                # Look for JSON in the response
-                import re
-                json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
-                if json_match:
-                    response_content = json_match.group()
-                else:
-                    raise ValueError("No JSON found in response")
-
-            analysis = json.loads(response_content)
-        except (json.JSONDecodeError, ValueError) as e:
+        # Budgeted history (recent turns verbatim, older ones summarized) for
+        # both calls; a stored session keeps its stable prefix
+        with timed_phase("history"):
+            if stateless:
+                history_messages, usage = context_builder.history(conversation_history)
+            else:
+                history_messages, usage = context_builder.session_history(summary, conversation_history)
+
+        def ask_llm():
+            # Build messages with conversation history
+            messages = [{"role": "system", "content": sys_prompt}, *history_messages,
+                        {"role": "user", "content": user_msg}]
+            usage["intent_prompt_tokens"] = context_builder.count(messages)
+
+            analysis_content = llm.complete(messages, temperature=0.1, purpose="intent")
+
+            # Parse the analysis response
+            try:
+                response_content = analysis_content.strip()
+                # Try to extract JSON if the response contains extra text
+                if not response_content.startswith('{'):
+                    # Look for JSON in the response
+                    json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
+                    if json_match:
+                        response_content = json_match.group()
+                    else:
+                        raise ValueError("No JSON found in response")
+
+                return json.loads(response_content)
+            except (json.JSONDecodeError, ValueError) as e:
+                current_app.logger.warning("Analysis parsing failed: %s, using fallback with all types", e)
+                return None
+
+        # Rules and cache first; the LLM only sees messages neither can answer
+        with timed_phase("intent"):
+            analysis = intent_extractor.extract(user_msg, conversation_history, available_types, ask_llm)
+        if analysis is None:
             # Fallback: create a default analysis that includes ALL available types
-            print(f"Analysis parsing failed: {e}, using fallback with all types")
             analysis = {
                 "city": None,
                 "capacity": None,
-                "buckets": available_types  # Use all available types as fallback
+                "buckets": list(available_types)  # Use all available types as fallback
             }
 
-        # 2. Run SQL filters per bucket with better filtering logic
-        results = {}
-        total_found = 0
-
-        for bucket in analysis.get("buckets", []):
-            q = Resource.query.filter_by(type=bucket)
-
-            # Apply city filter if specified
-            if analysis.get("city"):
-                city_name = analysis["city"].lower()
-                q = q.filter(Resource.city.ilike(f"%{city_name}%"))
-
-            # Apply capacity filter only for spaces
-            if analysis.get("capacity") and bucket == "Space":
-                q = q.filter(Resource.capacity >= analysis["capacity"])
-
-            # Order by relevance and limit results
-            q = q.order_by(Resource.name)
-            resources = q.limit(15).all()  # Increase limit to show more options
-            results[bucket] = [r.to_dict() for r in resources]
-            total_found += len(resources)
-
-        # Fallback: if no buckets were selected or very few results found, show all types
-        if not analysis.get("buckets") or total_found < 3:
-            print(f"Fallback triggered: buckets={analysis.get('buckets')}, total_found={total_found}")
-            analysis["buckets"] = available_types
-            results = {}
-            for bucket in available_types:
-                q = Resource.query.filter_by(type=bucket)
-
-                # Apply city filter if specified
-                if analysis.get("city"):
-                    city_name = analysis["city"].lower()
-                    q = q.filter(Resource.city.ilike(f"%{city_name}%"))
-
-                # Apply capacity filter only for spaces
-                if analysis.get("capacity") and bucket == "Space":
-                    q = q.filter(Resource.capacity >= analysis["capacity"])
-
-                q = q.order_by(Resource.name)
-                resources = q.limit(15).all()
-                if resources:  # Only include buckets that have results
-                    results[bucket] = [r.to_dict() for r in resources]
-
-        # Final safety net: if still no results, get everything
-        if not results or sum(len(res) for res in results.values()) == 0:
-            print("Final safety net: getting all resources")
-            all_resources = Resource.query.order_by(Resource.name).limit(50).all()
-            # Group by type
-            results = {}
-            for resource in all_resources:
-                rtype = resource.type or "Other"
-                if rtype not in results:
-                    results[rtype] = []
-                results[rtype].append(resource.to_dict())
-            analysis["buckets"] = list(results.keys())
+        # 2. Semantic top rows for the message; without an index, one windowed
+        #    query for the top rows per type, with the fallback tiers cut from it
+        with timed_phase("retrieval"):
+            results = retrieve_for_chat(analysis, available_types, query=user_msg)
 
         # 3. Let LLM draft friendly answer with conversation context
-        answer_prompt = f"""Conversation history: {json.dumps(conversation_history, indent=2)}
+        # History already travels as messages, so the prompt carries only the
+        # request and a compact resource table sized to the remaining budget
+        answer_template = """Current user request: {user_msg}
 
-Current user request: {user_msg}
-
-Available resources found:
-{json.dumps(results, indent=2)}
+Available resources found (one row per resource, columns as in the header; [Type] starts each group):
+{resources}
 
 Compose a helpful, friendly reply that:
 1. Acknowledges the conversation history and any previous context
@@ -417,39 +2376,70 @@ Compose a helpful, friendly reply that:
 
 If no resources are found for a category, mention that and suggest they could add resources via the admin panel."""
 
-        # Build messages for reply generation with full conversation context
+        # Build messages for reply generation with the budgeted conversation context
         reply_messages = [
-            {"role": "system", "content": "You are a helpful civic assistant for Timiș county, Romania. Help users plan events and find resources. Remember the conversation history and provide contextual responses."}
+            {"role": "system", "content": "You are a helpful civic assistant for Timiș county, Romania. Help users plan events and find resources. Remember the conversation history and provide contextual responses."},
+            *history_messages,
         ]
-
-        # Add conversation history for context
-        for msg in conversation_history:
-            if msg.get("role") in ["user", "assistant"]:
-                reply_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-
-        # Add the current context
-        reply_messages.append({"role": "user", "content": answer_prompt})
-
-        reply_response = client.chat.completions.create(
-            model="qwen/qwen3-14b",
-            messages=reply_messages,
-            temperature=0.3
-        )
-
-        reply = reply_response.choices[0].message.content
-
-        return jsonify({
-            "reply": reply,
-            "analysis": analysis,
-            "resources": results
-        })
-
+        with timed_phase("prompt"):
+            fixed = context_builder.count(reply_messages) + estimate_tokens(answer_template + user_msg) + 4
+            resources_text, resource_stats = context_builder.resources(results, context_builder.budget - fixed)
+            usage.update(resource_stats)
+
+            # Add the current context
+            answer_prompt = answer_template.format(user_msg=user_msg, resources=resources_text)
+            reply_messages.append({"role": "user", "content": answer_prompt})
+            usage["reply_prompt_tokens"] = context_builder.count(reply_messages)
+
+        if stream:
+            # Take the LLM slot before any bytes go out, so overload is still a 503
+            replies = llm.stream(reply_messages, temperature=0.3, purpose="reply")
+
+            # SSE: context first, then reply tokens as they are generated
+            def generate():
+                try:
+                    yield _sse("context", {"analysis": analysis, "resources": results, "usage": usage,
+                                           "session_id": None if stateless else session_id})
+                    parts = []
+                    try:
+                        with timed_phase("reply"):
+                            for delta in replies:
+                                parts.append(delta)
+                                yield _sse("token", {"text": delta})
+                    except Exception as e:
+                        current_app.logger.exception("Chat stream failed")
+                        yield _sse("error", {"error": f"AI processing failed: {str(e)}"})
+                        return
+                    reply = "".join(parts)
+                    if not stateless:
+                        conversations.save(session_id, summary, conversation_history, user_msg, reply)
+                    yield _sse("done", {"reply": reply})
+                finally:
+                    replies.close()             # client went away → stop generating
+            return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+        with timed_phase("reply"):
+            reply = llm.complete(reply_messages, temperature=0.3, purpose="reply")
+        if not stateless:
+            conversations.save(session_id, summary, conversation_history, user_msg, reply)
+
+        with timed_phase("serialize"):
+            return jsonify({
+                "reply": reply,
+                "analysis": analysis,
+                "resources": results,
+                "usage": usage,
+                "session_id": None if stateless else session_id
+            })
+
+    except LLMBusy as e:
+        current_app.logger.warning("Chat rejected: %s", e)
+        return jsonify({"error": f"AI assistant is busy: {e}. Please retry shortly."}), 503, {"Retry-After": "5"}
     except Exception as e:
+        current_app.logger.exception("Chat failed")
         return jsonify({"error": f"AI processing failed: {str(e)}"}), 500
 
 # ─────────────────────────────────────────────────────────
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,430 @@
+"""
+Benchmark suite over synthetic Timiș datasets.
+Usage:
+    python bench.py [--sizes=10000,100000] [--requests=200] [--chat=30] [--seed=7]
+                    [--only=import,map,admin,chat] [--save[=LABEL]]
+                    [--compare[=LABEL]] [--tolerance=0.25]
+Each size runs in its own child process against a fresh database in a temp
+directory: synthetic resources (cities, types, capacities, descriptions)
+are written to a CSV and loaded through import_csv.import_rows, the chat
+vector index is built (build_index.py), then every scenario is driven through the Flask test client. /api/chat talks to
+mock_llm.py with zero simulated latency, so only our side is measured.
+
+Per scenario: p50/p95/p99 latency, sequential throughput and the peak
+Python allocation of a few traced requests; per size: the child's peak RSS.
+Requests go through the response cache as in production, with randomized
+(seeded) viewports and queries. The admin run also fails if a keyset page
+would scan the table, or if the mixed batches leave the cluster, R*Tree or
+FTS tables out of step with a full recompute.
+
+--save stores the results in bench_baselines.json under LABEL (default:
+the current git commit); --compare prints the change against a stored
+label (default: the latest) and exits 1 if any p50/p95 latency or import
+rate got worse by more than --tolerance.
+"""
+import os, sys, csv, json, time, math, random, socket, tempfile, subprocess, resource, tracemalloc, urllib.request, urllib.error
+from pathlib import Path
+
+BASE      = Path(__file__).resolve().parent
+BASELINES = BASE / "bench_baselines.json"
+
+# ── synthetic dataset ───────────────────────────────────
+# (city, lat, lon, weight, spread in km)
+CITIES = [
+    ("Timișoara", 45.7489, 21.2087, 50, 5.0), ("Lugoj", 45.6886, 21.9031, 8, 2.0),
+    ("Sânnicolau Mare", 46.0722, 20.6294, 3, 1.5), ("Jimbolia", 45.7914, 20.7172, 3, 1.2),
+    ("Buziaș", 45.6486, 21.6036, 2, 1.0), ("Deta", 45.3886, 21.2247, 2, 1.0),
+    ("Recaș", 45.8006, 21.5083, 2, 1.0), ("Făget", 45.8500, 22.1833, 2, 1.0),
+    ("Gătaia", 45.4317, 21.4300, 1, 0.8), ("Ciacova", 45.5083, 21.1286, 1, 0.8),
+    ("Dumbrăvița", 45.7961, 21.2428, 4, 1.2), ("Giroc", 45.6944, 21.2356, 3, 1.2),
+    ("Moșnița Nouă", 45.7167, 21.3167, 3, 1.2), ("Ghiroda", 45.7631, 21.3006, 2, 1.0),
+    ("Săcălaz", 45.7581, 21.1164, 2, 1.0), ("Sânmihaiu Român", 45.7000, 21.0833, 1, 0.8),
+]
+TYPES = {
+    "Space":                 (30, ("Sala", "Casa de Cultură", "Centrul Comunitar", "Biblioteca", "Hub", "Aula", "Spațiul")),
+    "Event":                 (15, ("Festivalul", "Conferința", "Târgul", "Meetup", "Gala", "Seara")),
+    "Volunteer":             (15, ("Asociația", "ONG", "Liga Studenților", "Grupul de Voluntari", "Fundația")),
+    "Partner":               (12, ("SC", "Compania", "Institutul", "Camera de Comerț", "Clusterul")),
+    "Logistics":             (10, ("Catering", "Transport", "Sonorizare", "Închirieri Scaune", "Echipamente")),
+    "Project":               (7,  ("Proiectul", "Modernizarea", "Reabilitarea", "Inițiativa")),
+    "Grant":                 (6,  ("Granturi", "Fondul", "Programul de Finanțare", "Bursa")),
+    "Participatory Program": (5,  ("Bugetare Participativă", "Consultarea Publică", "Forumul Civic")),
+}
+TOPICS = ("Banat", "Tineret", "Cultură", "Digital", "Comunitate", "Arte", "Sport", "Educație",
+          "Mediu", "Inovare", "Patrimoniu", "Muzică", "Start-up", "Civic")
+FEATURES = ("proiector și sonorizare", "acces pentru persoane cu dizabilități", "parcare", "wifi",
+            "scenă", "catering la cerere", "spațiu în aer liber", "program flexibil",
+            "suport pentru voluntari", "finanțare nerambursabilă", "parteneriate locale",
+            "echipă de logistică", "sală de conferințe", "mentorat")
+
+def generate_rows(n, seed=7):
+    """Yield `n` CSV dict rows shaped like timis_public_resources.csv plus
+    Capacity/Description/Contact; ~2% are not localized (0, 0)."""
+    rng = random.Random(seed)
+    cities, city_weights = CITIES, [c[3] for c in CITIES]
+    types, type_weights = list(TYPES), [TYPES[t][0] for t in TYPES]
+    for i in range(n):
+        city, lat, lon, _, spread = rng.choices(cities, city_weights)[0]
+        rtype = rng.choices(types, type_weights)[0]
+        if rng.random() < 0.02:
+            lat = lon = 0.0
+        else:
+            lat += rng.gauss(0, spread / 111.0)
+            lon += rng.gauss(0, spread / (111.0 * math.cos(math.radians(lat))))
+        topic = rng.choice(TOPICS)
+        name = f"{rng.choice(TYPES[rtype][1])} {topic} {city} {i}"
+        capacity = int(min(3000, rng.lognormvariate(4.0, 0.9))) if rtype in ("Space", "Event") else None
+        features = ", ".join(rng.sample(FEATURES, 3))
+        slug = f"{topic.lower()}-{i}"
+        yield {
+            "Name": name, "Category": rtype, "City": city,
+            "Lat": f"{lat:.6f}", "Lon": f"{lon:.6f}",
+            "URL": f"https://example.ro/{slug}" if rng.random() < 0.7 else "",
+            "Capacity": capacity or "",
+            "Description": f"{rtype} {topic.lower()} în {city}: {features}.",
+            "Contact": f"contact@{slug}.example.ro" if rng.random() < 0.6 else "",
+        }
+
+def write_csv(path, n, seed):
+    fields = ["Name", "Category", "City", "Lat", "Lon", "URL", "Capacity", "Description", "Contact"]
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.DictWriter(fh, fieldnames=fields)
+        w.writeheader()
+        w.writerows(generate_rows(n, seed))
+
+# ── scenarios ───────────────────────────────────────────
+def _viewport(rng, span=0.05):
+    _, lat, lon, _, spread = rng.choices(CITIES, [c[3] for c in CITIES])[0]
+    lat += rng.gauss(0, spread / 111.0)
+    lon += rng.gauss(0, spread / 78.0)
+    return f"{lon - span:.4f},{lat - span * 0.6:.4f},{lon + span:.4f},{lat + span * 0.6:.4f}", lat, lon
+
+def map_requests(rng, n):
+    out = {"map_viewport_columnar": [], "map_viewport_json": [], "map_clusters": [],
+           "search": [], "nearby": []}
+    for _ in range(n):
+        bbox, lat, lon = _viewport(rng)
+        out["map_viewport_columnar"].append(("GET", f"/api/resources?bbox={bbox}&zoom=13&format=columnar", None))
+        out["map_viewport_json"].append(("GET", f"/api/resources?bbox={bbox}&zoom=14", None))
+        wide, _, _ = _viewport(rng, span=0.8)
+        out["map_clusters"].append(("GET", f"/api/resources/clusters?zoom={rng.randint(7, 11)}&bbox={wide}", None))
+        out["search"].append(("GET", f"/api/search?q={rng.choice(TOPICS)[:4]}+{rng.choice(CITIES)[0][:3]}", None))
+        out["nearby"].append(("GET", f"/api/nearby?lat={lat:.4f}&lon={lon:.4f}&radius={rng.choice((1, 3, 5))}", None))
+    return out
+
+CHAT_MESSAGES = (
+    "I need a venue for {n} people in {city}", "Any grants for a youth festival in {city}?",
+    "volunteers in {city}", "catering and sound equipment for a conference in {city}",
+    "what's available in {city}?", "help me plan something", "and in {city}?",
+)
+
+def chat_requests(rng, n):
+    reqs = []
+    for _ in range(n):
+        msg = rng.choice(CHAT_MESSAGES).format(n=rng.choice((30, 80, 200, 500)), city=rng.choice(CITIES)[0])
+        reqs.append(("POST", "/api/chat", {"message": msg}))
+    return reqs
+
+def _send(client, method, path, body):
+    resp = client.open(path, method=method, json=body)
+    data = resp.get_data()
+    if resp.status_code >= 400:
+        raise RuntimeError(f"{method} {path} → {resp.status_code}: {data[:200]!r}")
+    return resp
+
+BATCH_OPS = 200                 # operations per admin_batch request
+
+def batch_requests(rng, size, n, per_batch=BATCH_OPS):
+    """`n` POSTs to /admin/api/resources/batch, each ~1/4 creates, 1/4
+    deletes and 1/2 updates; a deleted id is never touched again."""
+    doomed = rng.sample(range(1, size + 1), min(size // 2, n * per_batch // 4))
+    kept = sorted(set(range(1, size + 1)) - set(doomed))
+    fresh = generate_rows(n * per_batch, seed=rng.randrange(2 ** 32))
+    reqs = []
+    for b in range(n):
+        ops = [{"op": "delete", "id": pid} for pid in doomed[b * per_batch // 4:(b + 1) * per_batch // 4]]
+        for row in (next(fresh) for _ in range(per_batch // 4)):
+            ops.append({"op": "create", "data": {
+                "name": row["Name"], "type": row["Category"], "category": row["Category"],
+                "city": row["City"], "lat": float(row["Lat"]), "lon": float(row["Lon"]),
+                "capacity": row["Capacity"] or None, "description": row["Description"]}})
+        for pid in rng.sample(kept, per_batch - len(ops)):
+            ops.append({"op": "update", "id": pid, "data": {"capacity": rng.randint(5, 200)}})
+        rng.shuffle(ops)
+        reqs.append(("POST", "/admin/api/resources/batch", {"operations": ops}))
+    return reqs
+
+def run_scenario(client, requests, traced=5):
+    """Time `requests` sequentially after one warm-up request; the last
+    `traced` (not yet cached) ones run under tracemalloc instead."""
+    _send(client, *requests[0])
+    latencies = []
+    started = time.perf_counter()
+    for req in requests[1:-traced]:
+        t0 = time.perf_counter()
+        _send(client, *req)
+        latencies.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - started
+    tracemalloc.start()
+    for req in requests[-traced:]:
+        _send(client, *req)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return summarize(latencies, wall, peak)
+
+def run_keyset_walk(client, n, query):
+    """Follow next_cursor through up to `n` pages."""
+    latencies, cursor = [], ""
+    started = time.perf_counter()
+    tracemalloc.start()
+    for _ in range(n):
+        t0 = time.perf_counter()
+        page = _send(client, "GET", f"/admin/api/resources?limit=50&{query}&cursor={cursor}", None).get_json()
+        latencies.append(time.perf_counter() - t0)
+        if not page["next_cursor"]:
+            break
+        cursor = page["next_cursor"]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return summarize(latencies, time.perf_counter() - started, peak)
+
+def check_keyset_plans():
+    """EXPLAIN every keyset branch the admin listing runs for the indexed sort
+    columns; raise if one scans the resource table instead of searching an
+    index (cost would then grow with cursor depth). Needs an app context."""
+    from app import db, Resource, _after
+    conn = db.session.connection()
+    for name, value in (("id", 1), ("city", "Lugoj"), ("city", None), ("type", "Event"), ("category", None)):
+        col = getattr(Resource, name)
+        for desc in (False, True):
+            order = (col.desc(), Resource.id.desc()) if desc else (col, Resource.id)
+            for cond in _after(col, value, 1, desc):
+                stmt = Resource.query.filter(cond).order_by(*order).limit(51).statement.compile(db.engine)
+                params = stmt.construct_params()
+                plan = [row[-1] for row in conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {stmt}", tuple(params[k] for k in stmt.positiontup))]
+                if any(step.startswith("SCAN resource") for step in plan):
+                    raise RuntimeError(f"keyset sort={'-' if desc else ''}{name} after {value!r} scans: {plan}")
+
+def check_derived_tables():
+    """Compare resource_cluster and resource_rtree with a full recompute from
+    the resource table and run the FTS5 integrity check; raise on any drift
+    the batch writes (triggers suspended, set-based deltas) left. Needs an app
+    context."""
+    from app import db, RTREE, FTS, _CLUSTER_CELL
+    conn = db.session.connection()
+    # Every recomputed row must match, and there must be no others (the keys are unique)
+    drift = conn.exec_driver_sql(f"""
+        WITH fresh(zoom, cx, cy, type, n, sum_lat, sum_lon) AS (
+            SELECT z.z, {_CLUSTER_CELL.format(r="r")}, r.type, count(*), sum(r.lat), sum(r.lon)
+            FROM resource r, cluster_zoom z
+            WHERE r.lat IS NOT NULL AND r.lon IS NOT NULL GROUP BY 1, 2, 3, 4)
+        SELECT (SELECT count(*) FROM fresh f LEFT JOIN resource_cluster c
+                    ON (c.zoom, c.cx, c.cy, c.type) = (f.zoom, f.cx, f.cy, f.type)
+                WHERE c.n IS NOT f.n OR abs(c.sum_lat - f.sum_lat) > 1e-6 OR abs(c.sum_lon - f.sum_lon) > 1e-6)
+             + abs((SELECT count(*) FROM fresh) - (SELECT count(*) FROM resource_cluster))
+    """).scalar()
+    if drift:
+        raise RuntimeError(f"resource_cluster differs from a recompute in {drift} cells")
+    # The R*Tree stores 32-bit floats, hence the tolerance
+    drift = conn.exec_driver_sql(f"""
+        SELECT (SELECT count(*) FROM resource r LEFT JOIN {RTREE} t ON t.id = r.id
+                WHERE r.lat IS NOT NULL AND r.lon IS NOT NULL
+                  AND (t.id IS NULL OR abs(t.min_lat - r.lat) > 1e-4 OR abs(t.min_lon - r.lon) > 1e-4))
+             + abs((SELECT count(*) FROM resource WHERE lat IS NOT NULL AND lon IS NOT NULL)
+                   - (SELECT count(*) FROM {RTREE}))
+    """).scalar()
+    if drift:
+        raise RuntimeError(f"{RTREE} differs from the resource table in {drift} rows")
+    # rank = 1 also checks the index against the external content table
+    from sqlalchemy.exc import DatabaseError
+    try:
+        conn.exec_driver_sql(f"INSERT INTO {FTS}({FTS}, rank) VALUES ('integrity-check', 1)")
+    except DatabaseError as e:
+        raise RuntimeError(f"{FTS} differs from the resource table: {e.orig}") from e
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000 if values else float("nan")
+
+def summarize(latencies, wall, peak):
+    return {"n": len(latencies), "p50_ms": round(pct(latencies, 50), 3), "p95_ms": round(pct(latencies, 95), 3),
+            "p99_ms": round(pct(latencies, 99), 3), "rps": round(len(latencies) / wall, 1),
+            "peak_kb": round(peak / 1024, 1)}
+
+def child(size, opts):
+    """Build one dataset in a scratch directory (removed afterwards, DB and
+    vector index included) and run every selected scenario; returns the results dict."""
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        return run_dataset(Path(tmp), size, opts)
+
+def run_dataset(tmp, size, opts):
+    only = set(opts.get("only", "import,map,admin,chat").split(","))
+    n_requests, n_chat, seed = max(10, int(opts.get("requests", 200))), int(opts.get("chat", 30)), int(opts.get("seed", 7))
+    csv_path, db_path = tmp / "resources.csv", tmp / "resources.db"
+    write_csv(csv_path, size, seed)
+
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db, User, build_vector_index
+    from import_csv import import_rows
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}"})
+    results = {}
+    with app.app_context():
+        t0 = time.perf_counter()
+        with csv_path.open(newline="", encoding="utf-8") as fh:
+            added, _ = import_rows(csv.DictReader(fh), progress=lambda *_: None)
+        elapsed = time.perf_counter() - t0
+        if "import" in only:
+            results["import"] = {"rows": added, "seconds": round(elapsed, 2),
+                                 "rows_per_s": round(added / elapsed, 1)}
+        t0 = time.perf_counter()
+        indexed = build_vector_index()
+        if "import" in only:
+            results["index_build"] = {"rows": indexed, "seconds": round(time.perf_counter() - t0, 2)}
+        db.session.add(User(username="bench", pw_hash=generate_password_hash("bench")))
+        db.session.commit()
+        if "admin" in only:
+            check_keyset_plans()
+
+    rng = random.Random(seed)
+    client = app.test_client()
+    if "map" in only:
+        for name, reqs in map_requests(rng, n_requests).items():
+            results[name] = run_scenario(client, reqs)
+        ids = [rng.randint(1, size) for _ in range(n_requests)]
+        results["resource_detail"] = run_scenario(client, [("GET", f"/api/resources/{i}", None) for i in ids])
+    if "admin" in only:
+        client.post("/login", data={"username": "bench", "password": "bench"})
+        pages = min(n_requests, max(1, size // 50))
+        results["admin_keyset"] = run_keyset_walk(client, pages, "sort=id")
+        results["admin_keyset_sorted"] = run_keyset_walk(client, pages, "sort=-capacity&type=Space")
+        results["admin_keyset_deep"] = run_scenario(client, [
+            ("GET", f"/admin/api/resources?after_id={rng.randint(size // 2, max(size // 2, size - 50))}&limit=50", None)
+            for _ in range(min(n_requests, 50))])
+        results["admin_offset_deep"] = run_scenario(client, [
+            ("GET", f"/admin/api/resources?offset={rng.randint(size // 2, max(size // 2, size - 50))}&limit=50", None)
+            for _ in range(min(n_requests, 50))])
+    if "chat" in only and n_chat >= 5:
+        results["chat"] = run_scenario(client, chat_requests(rng, n_chat), traced=3)
+    if "admin" in only:
+        # Writes last: they invalidate the caches the read scenarios measure
+        results["admin_batch"] = run_scenario(client, batch_requests(rng, size, min(n_requests, 50)))
+        with app.app_context():
+            check_derived_tables()
+    results["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    with app.app_context():
+        db.engine.dispose()                         # close pooled handles before the directory goes
+    return results
+
+# ── driver ──────────────────────────────────────────────
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_mock_llm():
+    port = _free_port()
+    env = dict(os.environ, MOCK_LLM_LATENCY="0", MOCK_LLM_TOKEN_DELAY="0")
+    proc = subprocess.Popen([sys.executable, str(BASE / "mock_llm.py"), str(port)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+        except urllib.error.HTTPError:
+            break                                   # 404 → server is up
+        except OSError:
+            time.sleep(0.1)
+    return proc, f"http://127.0.0.1:{port}/v1"
+
+def git_label():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BASE,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "local"
+
+def print_results(size, results, baseline=None):
+    print(f"\n── {size:,} resources  (peak RSS {results['peak_rss_mb']} MB)")
+    if "import" in results:
+        r = results["import"]
+        line = f"{'import_csv':<24}{r['rows']:>8} rows in {r['seconds']}s  {r['rows_per_s']:>12,.0f} rows/s"
+        if baseline and "import" in baseline:
+            line += f"  ({_delta(baseline['import']['rows_per_s'], r['rows_per_s'], higher_is_better=True)})"
+        print(line)
+    if "index_build" in results:
+        print(f"{'vector index':<24}{results['index_build']['rows']:>8} rows in {results['index_build']['seconds']}s")
+    print(f"{'scenario':<24}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'peak KB':>10}")
+    for name, r in results.items():
+        if not isinstance(r, dict) or "p50_ms" not in r:
+            continue
+        line = (f"{name:<24}{r['n']:>6}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+                f"{r['rps']:>10.1f}{r['peak_kb']:>10.0f}")
+        if baseline and name in baseline:
+            line += f"   p50 {_delta(baseline[name]['p50_ms'], r['p50_ms'])}, p95 {_delta(baseline[name]['p95_ms'], r['p95_ms'])}"
+        print(line)
+
+def _delta(old, new, higher_is_better=False):
+    if not old:
+        return "n/a"
+    change = (new - old) / old
+    return f"{change:+.0%}{' worse' if (change < 0 if higher_is_better else change > 0) else ''}"
+
+def regressions(size, results, baseline, tolerance):
+    found = []
+    if "import" in results and "import" in baseline:
+        if results["import"]["rows_per_s"] < baseline["import"]["rows_per_s"] * (1 - tolerance):
+            found.append(f"{size}: import rows/s")
+    for name, r in results.items():
+        old = baseline.get(name)
+        if isinstance(r, dict) and "p50_ms" in r and old:
+            for key in ("p50_ms", "p95_ms"):
+                if r[key] > old[key] * (1 + tolerance):
+                    found.append(f"{size}: {name} {key} {old[key]} → {r[key]}")
+    return found
+
+if __name__ == "__main__":
+    opts = dict((a[2:].split("=", 1) + [""])[:2] for a in sys.argv[1:] if a.startswith("--"))
+    if "child" in opts:
+        print(json.dumps(child(int(opts["child"]), opts)))
+        sys.exit(0)
+
+    sizes = [int(s) for s in opts.get("sizes", "10000,100000").split(",")]
+    stored = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    compare_to = opts.get("compare") or (next(reversed(stored), None) if "compare" in opts else None)
+    baseline = stored.get(compare_to, {}).get("sizes", {}) if compare_to else {}
+    if compare_to and not baseline:
+        print(f"No stored baseline {compare_to!r} in {BASELINES.name}")
+        sys.exit(2)
+
+    mock, llm_url = start_mock_llm()
+    all_results, problems = {}, []
+    try:
+        for size in sizes:
+            env = dict(os.environ, LLM_BASE_URL=llm_url, LOG_FORMAT="text")
+            args = [sys.executable, str(Path(__file__).resolve()), f"--child={size}",
+                    *(f"--{k}={v}" for k, v in opts.items() if k in ("requests", "chat", "seed", "only"))]
+            out = subprocess.run(args, env=env, cwd=BASE, capture_output=True, text=True)
+            if out.returncode:
+                print(out.stderr)
+                sys.exit(out.returncode)
+            results = json.loads(out.stdout.strip().splitlines()[-1])
+            all_results[str(size)] = results
+            print_results(size, results, baseline.get(str(size)))
+            if baseline.get(str(size)):
+                problems += regressions(size, results, baseline[str(size)], float(opts.get("tolerance", 0.25)))
+    finally:
+        mock.terminate()
+
+    if "save" in opts:
+        label = opts["save"] or git_label()
+        stored[label] = {"saved_at": time.strftime("%Y-%m-%d %H:%M:%S"), "sizes": all_results}
+        BASELINES.write_text(json.dumps(stored, indent=2, ensure_ascii=False))
+        print(f"\nSaved as {label!r} in {BASELINES.name}")
+    if compare_to:
+        print(f"\nCompared with {compare_to!r}: " + ("no regressions" if not problems else
+                                                     f"{len(problems)} regression(s)\n  " + "\n  ".join(problems)))
+        sys.exit(1 if problems else 0)
@@ -0,0 +1,22 @@
+"""
+Build the vector index used for semantic chat retrieval.
+Usage:
+    python build_index.py            # full rebuild, swapped in atomically
+    python build_index.py --sync     # only add/drop rows written outside the app
+The index lives next to the database (resources.index/). The app and
+import_csv.py keep it current afterwards, so a rebuild is only needed after
+edits made straight in SQLite, or to reclaim space from deleted rows.
+"""
+import sys, time
+from app import create_app, build_vector_index, sync_vector_index
+
+if __name__ == "__main__":
+    with create_app().app_context():
+        started = time.perf_counter()
+        if "--sync" in sys.argv[1:]:
+            added, removed = sync_vector_index()
+            print(f"Indexed: {added}  |  Removed: {removed}  |  {time.perf_counter() - started:.2f}s")
+        else:
+            rows = build_vector_index()
+            elapsed = time.perf_counter() - started
+            print(f"Indexed {rows} resources in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
@@ -3,14 +3,14 @@ python create_user.py alice supersecret
 """
 import sys
 from werkzeug.security import generate_password_hash
-from app import db, User, app
+from app import create_app, db, User
 
 if len(sys.argv)!=3:
     print("Usage: python create_user.py <username> <password>")
     sys.exit(1)
 
 username, pwd = sys.argv[1:3]
-with app.app_context():
+with create_app().app_context():
     if User.query.filter_by(username=username).first():
         print("User exists – updating password.")
         u = User.query.filter_by(username=username).first()
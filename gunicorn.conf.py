@@ -0,0 +1,26 @@
+"""
+Gunicorn settings for serving wsgi:app.
+Every value can be overridden from the environment, e.g.
+    WEB_CONCURRENCY=8 WEB_THREADS=16 gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os, multiprocessing
+
+bind      = os.getenv("BIND", "0.0.0.0:8000")
+workers   = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Threads keep SSE streams (chat replies, the admin change feed) from pinning
+# a whole worker each; the public map polls instead of streaming
+worker_class = "gthread"
+threads   = int(os.getenv("WEB_THREADS", "8"))
+timeout   = int(os.getenv("WEB_TIMEOUT", "120"))     # LLM replies can take a while
+keepalive = 5
+accesslog = "-"
+
+# Build the app (and apply pending migrations) once in the master, then fork
+preload_app = True
+
+def post_fork(server, worker):
+    # Pooled SQLite connections must not be shared across processes
+    from wsgi import app
+    from app import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,36 +1,82 @@
 """
 Bulk-import for timis_public_resources.csv
 Usage:
-    python import_csv.py path/to/timis_public_resources.csv
+    python import_csv.py [path/to/timis_public_resources.csv] [--chunk-size=N]
 If path is omitted, defaults to ./timis_public_resources.csv
-Duplicates (same name + lat + lon) are skipped.
+Columns: Name, Category, City, Lat, Lon, URL, plus optional Capacity,
+Description and Contact. Duplicates (same name + lat + lon) are skipped.
+Inserts bump dataset_version and are recorded in the resource change log, so
+running web workers drop their cached API responses within a second and open
+maps receive the new rows over the change feed (or reload, for large imports).
+
+The CSV is streamed in chunks: each chunk is checked against a preloaded set
+of existing (name, lat, lon) keys and written with one executemany inside its
+own transaction (see app.bulk_insert_resources), so re-importing the same
+file is a read-only no-op. New rows are added to the chat vector index when
+one has been built (see build_index.py).
 """
-import csv, sys, pathlib
-from app import app, db, Resource
+import csv, sys, time, pathlib
+from itertools import islice
+from app import create_app, db, Resource, bulk_insert_resources, index_resources
+
+DEFAULT_CHUNK_SIZE = 5000
 
-csv_path = pathlib.Path(sys.argv[1] if len(sys.argv) > 1 else "timis_public_resources.csv")
-if not csv_path.exists():
-    print(f"CSV not found: {csv_path}")
-    sys.exit(1)
+def _row_to_values(row):
+    return dict(
+        name=row["Name"],
+        type=row["Category"],
+        lat=float(row["Lat"]), lon=float(row["Lon"]),
+        city=row.get("City") or None,
+        url=row.get("URL") or None,
+        category=row.get("Category") or None,
+        # Optional columns (e.g. bench.py's synthetic datasets)
+        capacity=int(row["Capacity"]) if row.get("Capacity") else None,
+        description=row.get("Description") or None,
+        contact=row.get("Contact") or None
+    )
 
-with app.app_context():
+def import_rows(rows, chunk_size=DEFAULT_CHUNK_SIZE, progress=print):
+    """Insert CSV dict rows that are not already present. Returns (added, skipped).
+    Must run inside an app context."""
+    seen = {tuple(k) for k in db.session.execute(db.select(Resource.name, Resource.lat, Resource.lon))}
     added = skipped = 0
-    with csv_path.open(newline="", encoding="utf-8") as fh:
-        for row in csv.DictReader(fh):
-            name, lat, lon = row["Name"], float(row["Lat"]), float(row["Lon"])
-            exists = Resource.query.filter_by(name=name, lat=lat, lon=lon).first()
-            if exists:
+    started = time.perf_counter()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        fresh = []
+        for row in chunk:
+            values = _row_to_values(row)
+            key = (values["name"], values["lat"], values["lon"])
+            if key in seen:
                 skipped += 1
                 continue
-            resource = Resource(
-                name=name,
-                type=row["Category"],
-                lat=lat, lon=lon,
-                city=row.get("City") or None,
-                url=row.get("URL") or None,
-                category=row.get("Category") or None
-            )
-            db.session.add(resource)
-            added += 1
-        db.session.commit()
-    print(f"Imported: {added}  |  Skipped duplicates: {skipped}")
+            seen.add(key)
+            fresh.append(values)
+        if fresh:
+            first = bulk_insert_resources(fresh)
+            db.session.commit()
+            index_resources(Resource.query.filter(Resource.id > first))
+            added += len(fresh)
+        done = added + skipped
+        progress(f"  {done:>9} rows  |  {done / (time.perf_counter() - started):,.0f} rows/s")
+    return added, skipped
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--chunk-size")]
+    chunk_size = next((int(a.split("=", 1)[1]) for a in sys.argv[1:] if a.startswith("--chunk-size=")),
+                      DEFAULT_CHUNK_SIZE)
+    csv_path = pathlib.Path(args[0] if args else "timis_public_resources.csv")
+    if not csv_path.exists():
+        print(f"CSV not found: {csv_path}")
+        sys.exit(1)
+
+    with create_app().app_context():
+        started = time.perf_counter()
+        with csv_path.open(newline="", encoding="utf-8") as fh:
+            added, skipped = import_rows(csv.DictReader(fh), chunk_size)
+        elapsed = time.perf_counter() - started
+        print(f"Imported: {added}  |  Skipped duplicates: {skipped}  |  "
+              f"{elapsed:.2f}s ({(added + skipped) / max(elapsed, 1e-9):,.0f} rows/s)")
@@ -0,0 +1,87 @@
+"""
+Concurrent read-throughput test against a running server.
+Usage:
+    python loadtest.py [--url=http://127.0.0.1:8000] [--concurrency=32]
+                       [--duration=20] [--chat=0.05] [--writes=5]
+Each client loops over map traffic (viewport, cluster, search and nearby
+queries); a --chat fraction of requests go to /api/chat instead (point the
+server at mock_llm.py). --writes=N commits N resource updates per second
+straight into resources.db, the way admin saves and imports do, so the
+run shows whether readers stall behind writers. Compare e.g.
+    SQLITE_TUNING=0 flask run            vs.  gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import sys, json, time, random, sqlite3, threading, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+opts = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+URL         = opts.get("url", "http://127.0.0.1:8000").rstrip("/")
+CONCURRENCY = int(opts.get("concurrency", 32))
+DURATION    = float(opts.get("duration", 20))
+CHAT_SHARE  = float(opts.get("chat", 0.05))
+WRITES      = float(opts.get("writes", 5))
+DB          = Path(__file__).resolve().parent / "resources.db"
+
+def map_request():
+    lon, lat = 21.23 + random.uniform(-0.6, 0.6), 45.75 + random.uniform(-0.3, 0.3)
+    zoom = random.choice((10, 12, 13, 14))
+    bbox = f"{lon - 0.05:.4f},{lat - 0.03:.4f},{lon + 0.05:.4f},{lat + 0.03:.4f}"
+    return random.choice((
+        f"/api/resources?bbox={bbox}&zoom={zoom}&format=columnar",
+        f"/api/resources/clusters?zoom={zoom - 4}&bbox={bbox}",
+        f"/api/search?q={random.choice(('casa', 'timis', 'lugoj', 'bib', 'sala'))}",
+        f"/api/nearby?lat={lat:.4f}&lon={lon:.4f}&radius=5",
+    )), None
+
+def chat_request():
+    msg = random.choice(("I need a venue for 80 people in Timișoara",
+                         "Any grants for a youth festival?",
+                         "volunteers in Lugoj"))
+    return "/api/chat", json.dumps({"message": msg}).encode()
+
+def client(deadline, latencies, errors):
+    while time.monotonic() < deadline:
+        path, body = chat_request() if random.random() < CHAT_SHARE else map_request()
+        req = urllib.request.Request(URL + path, data=body,
+                                     headers={"Content-Type": "application/json"} if body else {})
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                resp.read()
+            latencies.append((path.split("?")[0], time.perf_counter() - t0))
+        except Exception:
+            errors.append(path)
+
+def writer(deadline, done):
+    con = sqlite3.connect(DB, timeout=30)
+    ids = [r[0] for r in con.execute("SELECT id FROM resource LIMIT 1000")]
+    while ids and time.monotonic() < deadline:
+        con.execute("UPDATE resource SET description = ? WHERE id = ?",
+                    (f"load test {time.time()}", random.choice(ids)))
+        con.commit()
+        done.append(1)
+        time.sleep(1 / WRITES)
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000 if values else float("nan")
+
+if __name__ == "__main__":
+    latencies, errors, writes = [], [], []
+    deadline = time.monotonic() + DURATION
+    if WRITES > 0:
+        threading.Thread(target=writer, args=(deadline, writes), daemon=True).start()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        for _ in range(CONCURRENCY):
+            pool.submit(client, deadline, latencies, errors)
+
+    print(f"{URL}  concurrency={CONCURRENCY}  duration={DURATION:.0f}s  writes={len(writes)}")
+    print(f"{'endpoint':<28}{'reqs':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    by_path = {}
+    for path, t in latencies:
+        by_path.setdefault(path, []).append(t)
+    for path, ts in sorted(by_path.items()):
+        print(f"{path:<28}{len(ts):>8}{pct(ts, 50):>10.1f}{pct(ts, 95):>10.1f}{pct(ts, 99):>10.1f}")
+    all_ts = [t for _, t in latencies]
+    print(f"{'total':<28}{len(all_ts):>8}{pct(all_ts, 50):>10.1f}{pct(all_ts, 95):>10.1f}{pct(all_ts, 99):>10.1f}")
+    print(f"throughput: {len(all_ts) / DURATION:,.1f} req/s  |  errors: {len(errors)}")
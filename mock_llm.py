@@ -0,0 +1,64 @@
+"""
+Minimal OpenAI-compatible chat server for exercising /api/chat without the
+real model.
+Usage:
+    python mock_llm.py [port]            # default 1234
+    LLM_BASE_URL=http://127.0.0.1:1234/v1 flask run
+Intent-extraction prompts get a fixed JSON answer; everything else gets a
+canned reply, streamed word by word when the client asks for stream=true.
+MOCK_LLM_LATENCY (seconds before the first token) and MOCK_LLM_TOKEN_DELAY
+(seconds between tokens) simulate generation time.
+"""
+import os, sys, json, time, uuid
+
+from flask import Flask, request, jsonify, Response
+
+LATENCY     = float(os.getenv("MOCK_LLM_LATENCY", "0.2"))
+TOKEN_DELAY = float(os.getenv("MOCK_LLM_TOKEN_DELAY", "0.02"))
+
+app = Flask(__name__)
+
+def _answer(messages):
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    if "output ONLY valid JSON" in system:
+        return json.dumps({"city": None, "capacity": None, "buckets": ["Space", "Volunteer"]})
+    last = messages[-1]["content"] if messages else ""
+    return ("Here are some resources that could help with your event. "
+            f"(mock reply to a {len(last)}-character prompt)")
+
+def _chunk(cid, model, delta, finish=None):
+    return "data: " + json.dumps({
+        "id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }) + "\n\n"
+
+@app.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    body = request.get_json(force=True)
+    model = body.get("model", "mock")
+    text = _answer(body.get("messages", []))
+    cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    prompt_tokens = sum(len(m.get("content", "")) // 4 for m in body.get("messages", []))
+    time.sleep(LATENCY)
+
+    if body.get("stream"):
+        def generate():
+            yield _chunk(cid, model, {"role": "assistant"})
+            for i, word in enumerate(text.split(" ")):
+                time.sleep(TOKEN_DELAY)
+                yield _chunk(cid, model, {"content": word if i == 0 else " " + word})
+            yield _chunk(cid, model, {}, finish="stop")
+            yield "data: [DONE]\n\n"
+        return Response(generate(), mimetype="text/event-stream")
+
+    time.sleep(TOKEN_DELAY * len(text.split(" ")))
+    return jsonify({
+        "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+                  "total_tokens": prompt_tokens + len(text) // 4},
+    })
+
+if __name__ == "__main__":
+    app.run(port=int(sys.argv[1]) if len(sys.argv) > 1 else 1234, threaded=True)
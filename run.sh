@@ -10,5 +10,10 @@ pip install -r requirements.txt
 # python create_user.py admin admin
 # python import_csv.py
 
+# ./run.sh prod → multi-worker gunicorn (see gunicorn.conf.py); default is the dev server
+if [ "$1" = "prod" ]; then
+  exec gunicorn -c gunicorn.conf.py wsgi:app
+fi
+
 export FLASK_APP=app.py
 flask run
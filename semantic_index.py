@@ -0,0 +1,267 @@
+"""
+Memory-mapped vector index for semantic resource retrieval.
+
+Documents and queries are bags of string features (see app._semantic_features)
+hashed into `dim` signed buckets. Document vectors hold log-scaled term
+frequencies, L2-normalized, as float16; queries weight their features by IDF
+at search time, so documents can be added or rewritten one at a time without
+touching the rest of the matrix.
+
+Layout of the index directory:
+    vectors.npy   float16 [capacity, dim]   one row per slot (np.lib.format, memory-mapped)
+    ids.npy       int64   [capacity]        resource id per slot, 0 = free
+    df.npy        int32   [DF_BUCKETS]      document frequency per hashed feature
+    meta.json     {"dim", "rows", "docs", "version"}
+
+Writers and rebuilds serialize across processes with flock() on <dir>.lock,
+kept beside the directory so it survives the swap a rebuild ends with. A
+rebuild holds it throughout: writes made meanwhile wait and then land in
+the new index. Readers and writers re-open the memory maps when meta.json
+or the directory itself changes, so every worker sees writes made by the
+others. Removed slots are zeroed and only reclaimed by a
+rebuild; document frequencies are only ever incremented between rebuilds,
+which skews IDF slightly for heavily edited rows.
+"""
+import os, json, math, zlib, fcntl, shutil, threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_DIM = 512
+DF_BUCKETS  = 1 << 18
+MIN_CAPACITY = 1024
+BLOCK_ROWS   = 4096             # rows encoded between writes to the map during a build
+
+def _bag(features):
+    """features → {feature hash: count}"""
+    bag, crc32 = {}, zlib.crc32
+    for f in features:
+        h = crc32(f.encode())
+        bag[h] = bag.get(h, 0) + 1
+    return bag
+
+class VectorIndex:
+    def __init__(self, directory, dim=DEFAULT_DIM):
+        self.dir = Path(directory)
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._stamp = None              # meta.json mtime the maps were opened at
+        self._mode = None
+        self._slots = None              # id → slot, built lazily for writers
+
+    # ── files ──────────────────────────────────────────
+    def exists(self):
+        return (self.dir / "meta.json").exists()
+
+    def _meta_stamp(self):
+        try:
+            meta = (self.dir / "meta.json").stat()
+            return self.dir.stat().st_ino, meta.st_ino, meta.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _open(self, mode="r"):
+        """(Re)open the memory maps if another process changed the index."""
+        stamp = self._meta_stamp()              # a rebuilt directory never matches
+        if stamp is None:
+            raise FileNotFoundError(f"No vector index in {self.dir}")
+        if stamp != self._stamp or (mode == "r+" and self._mode != "r+"):
+            self.meta = json.loads((self.dir / "meta.json").read_text())
+            self.dim = self.meta["dim"]
+            self.vectors = np.load(self.dir / "vectors.npy", mmap_mode=mode)
+            self.ids = np.load(self.dir / "ids.npy", mmap_mode=mode)
+            self.df = np.load(self.dir / "df.npy", mmap_mode=mode)
+            self._mode, self._stamp, self._slots = mode, stamp, None
+
+    def _write_meta(self):
+        tmp = self.dir / "meta.json.tmp"
+        tmp.write_text(json.dumps(self.meta))
+        os.replace(tmp, self.dir / "meta.json")
+        self._stamp = self._meta_stamp()
+
+    @contextmanager
+    def _exclusive(self):
+        """flock() on <dir>.lock: one writer or rebuild at a time across processes."""
+        self.dir.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.dir.with_name(self.dir.name + ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive across threads and processes; yields with r+ maps open
+        on the current directory (re-opened if a rebuild swapped it)."""
+        with self._exclusive(), self._lock:
+            self._open("r+")
+            yield
+            self.vectors.flush(); self.ids.flush(); self.df.flush()
+            self._write_meta()
+
+    # ── encoding ───────────────────────────────────────
+    def _encode(self, features, out):
+        """Write the document vector for `features` into `out` (a zeroed row);
+        returns the feature hashes."""
+        acc, dim = {}, self.dim
+        bag = _bag(features)
+        for h, n in bag.items():
+            b = h % dim
+            acc[b] = acc.get(b, 0.0) + ((1.0 + math.log(n)) if h & 0x80000000 else -(1.0 + math.log(n)))
+        norm = math.sqrt(sum(v * v for v in acc.values()))
+        if norm:
+            out[list(acc)] = [v / norm for v in acc.values()]
+        return bag.keys()
+
+    # ── writes ─────────────────────────────────────────
+    def build(self, docs, version=None):
+        """Full rebuild from (id, features) pairs, swapped in atomically.
+        Holds the writer lock throughout, so no upsert or remove is lost to
+        the old directory."""
+        with self._exclusive():
+            return self._build(docs, version)
+
+    def _build(self, docs, version):
+        tmp = self.dir.with_name(self.dir.name + ".building")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        capacity = MIN_CAPACITY
+        vectors = np.lib.format.open_memmap(tmp / "vectors.npy", "w+", np.float16, (capacity, self.dim))
+        ids = np.lib.format.open_memmap(tmp / "ids.npy", "w+", np.int64, (capacity,))
+        df = np.zeros(DF_BUCKETS, dtype=np.int32)
+        rows, block = 0, np.zeros((BLOCK_ROWS, self.dim), dtype=np.float32)
+        block_ids = []
+
+        def flush_block():
+            nonlocal vectors, ids, capacity
+            n = len(block_ids)
+            while rows + n > capacity:
+                vectors.flush(); ids.flush()
+                del vectors, ids
+                vectors, ids = self._grow(tmp, capacity * 2)
+                capacity *= 2
+            vectors[rows:rows + n] = block[:n]
+            ids[rows:rows + n] = block_ids
+            block[:n] = 0
+            block_ids.clear()
+            return n
+
+        for pid, features in docs:
+            for h in self._encode(features, block[len(block_ids)]):
+                df[h % DF_BUCKETS] += 1
+            block_ids.append(pid)
+            if len(block_ids) == BLOCK_ROWS:
+                rows += flush_block()
+        rows += flush_block()
+        vectors.flush(); ids.flush()
+        del vectors, ids
+        np.save(tmp / "df.npy", df)
+        (tmp / "meta.json").write_text(json.dumps(
+            {"dim": self.dim, "rows": rows, "docs": rows, "version": version}))
+        with self._lock:
+            old = self.dir.with_name(self.dir.name + ".old")
+            shutil.rmtree(old, ignore_errors=True)
+            if self.dir.exists():
+                os.replace(self.dir, old)
+            os.replace(tmp, self.dir)
+            shutil.rmtree(old, ignore_errors=True)
+            self._stamp = None
+        return rows
+
+    def _grow(self, directory, capacity):
+        """Copy vectors/ids into files of `capacity` rows; returns new r+ maps."""
+        maps = []
+        for name in ("vectors.npy", "ids.npy"):
+            old = np.load(directory / name, mmap_mode="r")
+            new = np.lib.format.open_memmap(directory / (name + ".tmp"), "w+", old.dtype,
+                                            (capacity, *old.shape[1:]))
+            new[:len(old)] = old
+            new.flush()
+            del new, old
+            os.replace(directory / (name + ".tmp"), directory / name)
+            maps.append(np.load(directory / name, mmap_mode="r+"))
+        return maps
+
+    def _slot_map(self):
+        if self._slots is None:
+            used = self.ids[:self.meta["rows"]]
+            self._slots = {int(pid): int(slot) for slot, pid in zip(np.flatnonzero(used), used[used != 0])}
+        return self._slots
+
+    def upsert(self, docs, version=None):
+        """Add or rewrite (id, features) pairs."""
+        docs = list(docs)
+        if not docs:
+            return
+        with self._writing():
+            slots = self._slot_map()
+            fresh = sum(1 for pid, _ in docs if pid not in slots)
+            if self.meta["rows"] + fresh > len(self.ids):
+                capacity = max(len(self.ids) * 2, self.meta["rows"] + fresh)
+                del self.vectors, self.ids
+                self.vectors, self.ids = self._grow(self.dir, capacity)
+            # Encode into a block, then write rows and df counts with one
+            # fancy-indexed assignment each instead of per-row map writes
+            for start in range(0, len(docs), BLOCK_ROWS):
+                chunk = docs[start:start + BLOCK_ROWS]
+                block = np.zeros((len(chunk), self.dim), dtype=np.float32)
+                targets, hashes = [], []
+                for row, (pid, features) in zip(block, chunk):
+                    hashes.extend(self._encode(features, row))
+                    slot = slots.get(pid)
+                    if slot is None:
+                        slot = slots[pid] = self.meta["rows"]
+                        self.meta["rows"] += 1
+                        self.meta["docs"] += 1
+                        self.ids[slot] = pid
+                    targets.append(slot)
+                # A pid repeated within the chunk keeps its last encoding
+                self.vectors[np.array(targets, dtype=np.intp)] = block
+                np.add.at(self.df, np.array(hashes, dtype=np.int64) % DF_BUCKETS, 1)
+            if version is not None:
+                self.meta["version"] = version
+
+    def remove(self, pids, version=None):
+        with self._writing():
+            slots = self._slot_map()
+            for pid in pids:
+                slot = slots.pop(pid, None)
+                if slot is not None:
+                    self.ids[slot] = 0
+                    self.vectors[slot] = 0
+                    self.meta["docs"] -= 1
+            if version is not None:
+                self.meta["version"] = version
+
+    def indexed_ids(self):
+        with self._lock:
+            self._open()
+            used = self.ids[:self.meta["rows"]]
+            return set(used[used != 0].tolist())
+
+    # ── reads ──────────────────────────────────────────
+    def search(self, features, k=20):
+        """→ [(id, score), ...] best first, for rows sharing any feature."""
+        with self._lock:
+            self._open()
+            vectors, ids, df, rows, docs = self.vectors, self.ids, self.df, self.meta["rows"], self.meta["docs"]
+        weights = {}
+        for h, n in _bag(features).items():
+            seen = int(df[h % DF_BUCKETS])
+            if not seen:
+                continue                # could only match through bucket collisions
+            idf = math.log((docs + 1) / (seen + 1)) + 1.0
+            bucket = h % self.dim
+            weights[bucket] = weights.get(bucket, 0.0) + idf * n * (1 if h & 0x80000000 else -1)
+        if not weights or not rows:
+            return []
+        # Only the query's non-zero buckets matter: gather those columns
+        cols = np.fromiter(weights, dtype=np.intp)
+        w = np.fromiter(weights.values(), dtype=np.float32)
+        scores = np.asarray(vectors[:rows, cols], dtype=np.float32) @ w
+        k = min(k, rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0 and ids[i]]
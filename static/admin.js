@@ -6,7 +6,7 @@ document.addEventListener("DOMContentLoaded", () => {
               { attribution: "&copy; OpenStreetMap contributors" })
     .addTo(map);
 
-  const markers = new Map();   // id → Leaflet marker
+  const markers = new Map();   // id → Leaflet marker (all types; the filter only hides them)
   let currentType = '';   // current filter
 
   // ── Modal elements ───────────────────────────────────────
@@ -41,23 +41,58 @@ document.addEventListener("DOMContentLoaded", () => {
       });
   }
 
+  function showIfMatches(m) {
+    if (!currentType || m.rtype === currentType) m.addTo(map);
+    else map.removeLayer(m);
+  }
+
+  function putMarker(pid, lat, lon, rtype) {
+    let m = markers.get(pid);
+    if (m) {
+      m.setLatLng([lat, lon]);
+    } else {
+      m = L.marker([lat, lon]);
+      m.on("click", () => {
+        fetch(`/admin/api/resources/${pid}`)
+          .then(r => r.json())
+          .then(openModal);
+      });
+      markers.set(pid, m);
+    }
+    m.rtype = rtype;
+    showIfMatches(m);
+  }
+
+  function removeMarker(pid) {
+    const m = markers.get(pid);
+    if (m) {
+      map.removeLayer(m);
+      markers.delete(pid);
+    }
+  }
+
   function loadMarkers() {
-    const url = currentType ? `/admin/api/resources?type=${encodeURIComponent(currentType)}` : "/admin/api/resources";
-    fetch(url)
-      .then(r => r.json())
+    // Columnar payload for drawing; the full record is fetched when a marker is clicked
+    return fetchColumns("/api/resources")
       .then(data => {
         // clear existing
         markers.forEach(m => map.removeLayer(m));
         markers.clear();
 
-        data.forEach(p => {
-          const m = L.marker([p.lat, p.lon]).addTo(map);
-          m.on("click", () => openModal(p));
-          markers.set(p.id, m);
-        });
+        const { id, lat, lon } = data.columns;
+        for (let i = 0; i < data.count; i++) {
+          putMarker(id[i], lat[i], lon[i], data.get("type", i));
+        }
       });
   }
 
+  // Writes from this tab and from other admins, as reported by the change feed
+  function applyChange(c) {
+    const r = c.resource;
+    if (c.op === "delete" || r.lat == null || r.lon == null) removeMarker(c.id);
+    else putMarker(c.id, r.lat, r.lon, r.type);
+  }
+
   function openModal(place = null) {
     if (place) {                 // editing
       idField.value      = place.id;
@@ -116,9 +151,9 @@ document.addEventListener("DOMContentLoaded", () => {
       if (!r.ok) throw new Error("Save failed");
       return r.json();
     })
-    .then(() => {
+    .then(place => {
       modal.close();
-      loadMarkers();
+      applyChange({ op: "upsert", id: place.id, resource: place });
     })
     .catch(alert);
   });
@@ -128,7 +163,12 @@ document.addEventListener("DOMContentLoaded", () => {
     const id = idField.value;
     if (confirm("Delete this resource?")) {
       fetch(`/admin/api/resources/${id}`, { method: "DELETE" })
-        .then(() => { modal.close(); loadMarkers(); });
+        .then(r => {
+          if (!r.ok) throw new Error("Delete failed");
+          modal.close();
+          removeMarker(parseInt(id));
+        })
+        .catch(alert);
     }
   });
 
@@ -137,10 +177,13 @@ document.addEventListener("DOMContentLoaded", () => {
   // ── Type filter ──────────────────────────────────────
   typeFilter.addEventListener("change", (e) => {
     currentType = e.target.value;
-    loadMarkers();
+    markers.forEach(showIfMatches);
   });
 
-  // initial load
+  // initial load, then follow everyone's edits
   loadTypes();
-  loadMarkers();
+  changeVersion()
+    .then(version => loadMarkers().then(() => {
+      followChanges(version, changes => changes.forEach(applyChange), loadMarkers);
+    }));
 });
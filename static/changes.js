@@ -0,0 +1,61 @@
+// public_resources_map/static/changes.js
+// Client for the resource change feed (see api_resource_changes in app.py).
+
+const CHANGE_POLL_MS = 10000;
+
+function fetchChanges(query) {
+  return fetch(`/api/resources/changes${query}`)
+    .then(r => {
+      if (!r.ok) throw new Error(`HTTP ${r.status}`);
+      return r.json();
+    });
+}
+
+// Current change-log version. Read it *before* loading a full listing and
+// hand it to followChanges or pollChanges, so nothing written in between is missed.
+function changeVersion() {
+  return fetchChanges("").then(d => d.version);
+}
+
+// Stream changes after `since`: onChanges([{v, op, id, resource}, ...]) for
+// each batch, onReset() when the client must reload its listing instead.
+// EventSource reconnects by itself and resumes from the last event id.
+// Each open stream holds a server thread, so only the admin pages use it.
+function followChanges(since, onChanges, onReset) {
+  const source = new EventSource(`/api/resources/changes/stream?since=${since}`);
+  source.addEventListener("changes", e => onChanges(JSON.parse(e.data)));
+  source.addEventListener("reset", () => onReset());
+  return source;
+}
+
+// Same callbacks as followChanges, from the cached feed every `interval` ms:
+// an unchanged feed answers with a 304 and no thread is held in between.
+// Polls are skipped while the page is hidden. A client more than one page
+// behind reloads instead of paging through, like a stream reset.
+function pollChanges(since, onChanges, onReset, interval = CHANGE_POLL_MS) {
+  let version = since, timer = null, closed = false;
+  const poll = () => {
+    const next = document.hidden ? Promise.resolve() : fetchChanges(`?since=${version}`)
+      .then(d => {
+        if (d.reset) {
+          version = d.version;
+          onReset();
+        } else if (d.more) {
+          return changeVersion().then(v => {
+            version = v;
+            onReset();
+          });
+        } else {
+          version = d.version;
+          if (d.changes.length) onChanges(d.changes);
+        }
+      });
+    next
+      .catch(err => console.warn("change poll failed:", err))
+      .then(() => {
+        if (!closed) timer = setTimeout(poll, interval);
+      });
+  };
+  timer = setTimeout(poll, interval);
+  return { close() { closed = true; clearTimeout(timer); } };
+}
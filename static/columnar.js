@@ -0,0 +1,48 @@
+// public_resources_map/static/columnar.js
+// Decoder for the columnar resource format (see encode_columns in app.py).
+const COLUMNAR_MIME = "application/x-resource-columns";
+
+function decodeColumns(buffer) {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== "RCOL") throw new Error("Not a columnar payload");
+  const headerLen = view.getUint32(4, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLen)));
+  const base = 8 + headerLen;
+  const n = header.count;
+  const columns = {};
+
+  header.columns.forEach(col => {
+    const at = base + col.offset;
+    switch (col.kind) {
+      case "u32":  columns[col.name] = new Uint32Array(buffer, at, n); break;
+      case "i32":  columns[col.name] = new Int32Array(buffer, at, n); break;
+      case "f32":  columns[col.name] = new Float32Array(buffer, at, n); break;
+      case "dict": columns[col.name] = { codes: new Uint16Array(buffer, at, n), values: col.values }; break;
+      case "str":  columns[col.name] = col.values; break;
+    }
+  });
+
+  // Row accessor: value of column `name` at index i, with nulls restored
+  function get(name, i) {
+    const c = columns[name];
+    if (c.codes) return c.codes[i] === 0xFFFF ? null : c.values[c.codes[i]];
+    const v = c[i];
+    if (c instanceof Float32Array && Number.isNaN(v)) return null;
+    if (c instanceof Int32Array && v === -2147483648) return null;
+    return v;
+  }
+
+  return { count: n, columns, get };
+}
+
+// fetch() a columnar endpoint and decode it
+function fetchColumns(url) {
+  const sep = url.includes("?") ? "&" : "?";
+  return fetch(`${url}${sep}format=columnar`, { headers: { Accept: COLUMNAR_MIME } })
+    .then(r => {
+      if (!r.ok) throw new Error(`HTTP ${r.status}`);
+      return r.arrayBuffer();
+    })
+    .then(decodeColumns);
+}